@@ -16,6 +16,7 @@ ALPACA_API_KEY    = os.getenv("ALPACA_API_KEY", "")
 ALPACA_SECRET_KEY = os.getenv("ALPACA_SECRET_KEY", "")
 ALPACA_BASE_URL = "https://paper-api.alpaca.markets"
 ALPACA_DATA_URL   = "https://data.alpaca.markets"
+ALPACA_DATA_MAX_RPS = 3.0   # حد طلبات Data API — الخطة المجانية 200 طلب/دقيقة (3/ث = 180)
 
 # يُحدَّد تلقائياً بناءً على الـ URL
 IS_PAPER = "paper" in ALPACA_BASE_URL.lower()
@@ -100,7 +101,7 @@ MAX_MOMENTUM_SHORT = 1  # Momentum : أقصى 1 بيع
 # ─────────────────────────────────────────
 # 10. توقيت السوق (بتوقيت نيويورك)
 # ─────────────────────────────────────────
-TIMEZONE                = "America/New_York"  # pytz يتعامل مع EST/EDT تلقائياً
+TIMEZONE                = "America/New_York"  # zoneinfo يتعامل مع EST/EDT تلقائياً
 MARKET_OPEN             = "09:35"             # نتجاهل أول 5 دقائق من الجلسة
 MARKET_CLOSE            = "15:45"             # نتوقف 15 دقيقة قبل الإغلاق
 PRE_MARKET_ALERT        = 30                  # تنبيه قبل الافتتاح بـ 30 دقيقة
@@ -4,9 +4,12 @@
 # =============================================================
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import os
-from datetime import datetime
+from zoneinfo import ZoneInfo
+from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import Optional
 
@@ -27,12 +30,16 @@ OPEN_TRADES_SHEET  = "Open Trades"
 CLOSED_TRADES_SHEET = "Closed Trades"
 CREDENTIALS_ENV   = "GOOGLE_CREDENTIALS_JSON"
 
+# توقيت opened_at عند قراءة الصفقات من Sheets — يُنشأ مرة واحدة
+TZ = ZoneInfo(os.getenv("TIMEZONE", "America/New_York"))
+
 # ─── Sheets Cache — يتجنب إعادة إنشاء OAuth + client في كل استدعاء
 _sheets_cache = {
     "gc": None,            # gspread client
     "ss": None,            # spreadsheet object
     "open_ws": None,       # Open Trades worksheet
     "closed_ws": None,     # Closed Trades worksheet
+    "open_rows": None,     # {ticker: رقم الصف} في Open Trades — None = غير معروف بعد
     "created_at": 0.0,     # وقت آخر إنشاء (timestamp)
 }
 _SHEETS_CACHE_TTL = 600  # 10 دقائق — بعدها يُعاد الاتصال (OAuth token refresh)
@@ -80,6 +87,7 @@ def _invalidate_sheets_cache():
     _sheets_cache["ss"] = None
     _sheets_cache["open_ws"] = None
     _sheets_cache["closed_ws"] = None
+    _sheets_cache["open_rows"] = None
     _sheets_cache["created_at"] = 0.0
 
 
@@ -175,6 +183,9 @@ def _save_open_trades(trades: list) -> None:
             cell_range = f"A2:{chr(64 + len(all_rows[0]))}{len(all_rows) + 1}"
             ws.update(cell_range, all_rows, value_input_option="RAW")
 
+        # ── نعرف مكان كل صفقة الآن — _update_trade_in_sheets لا يحتاج قراءة الشيت
+        _sheets_cache["open_rows"] = {t.ticker: idx for idx, t in enumerate(unique_trades, start=2)}
+
         print(f"✅ حُفظت {len(unique_trades)} صفقة مفتوحة في Google Sheets (batch)")
     except Exception as e:
         print(f"⚠️  فشل حفظ الصفقات المفتوحة: {e}")
@@ -192,20 +203,27 @@ def _update_trade_in_sheets(trade) -> None:
     if not ws:
         return
     try:
-        rows = ws.get_all_records()
         row_data = _trade_to_row(trade)
 
-        # ── البحث عن الصف بالـ ticker
-        for idx, r in enumerate(rows, start=2):  # start=2 لأن صف 1 = headers
-            if str(r.get("ticker", "")) == trade.ticker:
-                # تحديث الصف الموجود
-                cell_range = f"A{idx}:Q{idx}"
-                ws.update(cell_range, [row_data], value_input_option="RAW")
-                print(f"  ✅ Sheets: تحديث {trade.ticker} (صف {idx})")
-                return
-
-        # ── الصف غير موجود — إضافة جديدة
+        # ── فهرس الصفوف من الـ cache — القراءة (عمود ticker فقط) عند الحاجة فقط
+        # الشيت يكتبه هذا النظام وحده، لذلك الفهرس يبقى صحيحاً بين الكتابات
+        open_rows = _sheets_cache["open_rows"]
+        if open_rows is None:
+            tickers   = ws.col_values(1)[1:]  # صف 1 = headers
+            open_rows = {str(t): idx for idx, t in enumerate(tickers, start=2) if t}
+            _sheets_cache["open_rows"] = open_rows
+
+        idx = open_rows.get(trade.ticker)
+        if idx is not None:
+            # تحديث الصف الموجود
+            cell_range = f"A{idx}:Q{idx}"
+            ws.update(cell_range, [row_data], value_input_option="RAW")
+            print(f"  ✅ Sheets: تحديث {trade.ticker} (صف {idx})")
+            return
+
+        # ── الصف غير موجود — إضافة جديدة (الفهرس يُعاد بناؤه في الاستدعاء التالي)
         ws.append_row(row_data, value_input_option="RAW")
+        _sheets_cache["open_rows"] = None
         print(f"  ✅ Sheets: إضافة {trade.ticker} (صف جديد)")
     except Exception as e:
         print(f"  ⚠️  فشل تحديث {trade.ticker} في Sheets: {e}")
@@ -219,6 +237,7 @@ def _delete_open_trades_sheets() -> None:
     try:
         ws.resize(rows=1)
         ws.resize(rows=100)
+        _sheets_cache["open_rows"] = {}
         print("✅ تم مسح Open Trades من Google Sheets")
     except Exception as e:
         print(f"⚠️  فشل مسح Open Trades: {e}")
@@ -295,8 +314,26 @@ def load_closed_trades_by_date_sheets(target_date: str) -> list[dict]:
     if not ws:
         return []
     try:
-        rows = ws.get_all_records()
-        return [r for r in rows if str(r.get("date", "")) == target_date]
+        from gspread.utils import numericise_all
+
+        # ── عمود التاريخ فقط أولاً، ثم نطاق صفوف ذلك اليوم — بدل قراءة كل التاريخ
+        # الصفقات تُضاف بالترتيب الزمني، لذلك صفوف اليوم الواحد متجاورة
+        dates = ws.col_values(1)
+        idxs  = [i for i, d in enumerate(dates, start=1) if i > 1 and d == target_date]
+        if not idxs:
+            return []
+
+        last_col = chr(64 + len(CLOSED_HEADERS))
+        values   = ws.get(f"A{idxs[0]}:{last_col}{idxs[-1]}")
+
+        records = []
+        for row in values:
+            # نفس تحويل get_all_records: أرقام كأرقام، والخلايا الفارغة في النهاية ""
+            row = numericise_all(row) + [""] * (len(CLOSED_HEADERS) - len(row))
+            rec = dict(zip(CLOSED_HEADERS, row))
+            if str(rec.get("date", "")) == target_date:
+                records.append(rec)
+        return records
     except Exception as e:
         print(f"⚠️  فشل جلب Closed Trades من Sheets: {e}")
         _invalidate_sheets_cache()
@@ -311,14 +348,12 @@ def _load_open_trades_from_sheets() -> list:
         rows = ws.get_all_records()
         if not rows:
             return []
-        import pytz
-        TZ     = pytz.timezone(os.getenv("TIMEZONE", "America/New_York"))
         trades = []
         for d in rows:
             try:
                 opened_at = datetime.fromisoformat(str(d["opened_at"]))
                 if opened_at.tzinfo is None:
-                    opened_at = TZ.localize(opened_at)
+                    opened_at = opened_at.replace(tzinfo=TZ)
             except Exception:
                 opened_at = datetime.now(TZ)
             trade = OpenTrade(
@@ -356,7 +391,7 @@ def get_open_positions() -> list:
     """
     alpaca_symbols = set()
     try:
-        r = requests.get(f"{ALPACA_BASE_URL}/v2/positions", headers=HEADERS, timeout=10)
+        r = SESSION.get(f"{ALPACA_BASE_URL}/v2/positions", headers=HEADERS, timeout=10)
         if r.status_code == 200:
             for pos in r.json():
                 alpaca_symbols.add(pos.get("symbol",""))
@@ -387,7 +422,7 @@ def get_open_positions() -> list:
 
     print("ℹ️  لا يوجد بيانات في Sheets — استعادة من Alpaca (مستويات تقريبية)...")
     try:
-        r      = requests.get(f"{ALPACA_BASE_URL}/v2/positions", headers=HEADERS, timeout=10)
+        r      = SESSION.get(f"{ALPACA_BASE_URL}/v2/positions", headers=HEADERS, timeout=10)
         trades = []
         for pos in r.json():
             symbol = pos.get("symbol","")
@@ -419,6 +454,19 @@ def get_open_positions() -> list:
         return []
 
 
+def _trade_age_seconds(trade, now_utc: datetime) -> Optional[float]:
+    """
+    عمر الصفقة بالثواني مقارنة بـ now_utc (يُمرَّر من المستدعي مرة واحدة لكل دورة).
+    opened_at بدون timezone يُعامل كـ UTC. None إذا لا يوجد وقت فتح.
+    """
+    opened = trade.opened_at
+    if opened is None:
+        return None
+    if opened.tzinfo is None:
+        opened = opened.replace(tzinfo=timezone.utc)
+    return (now_utc - opened).total_seconds()
+
+
 def sync_with_alpaca(open_trades: list) -> list:
     """
     يكتشف الصفقات المغلقة يدوياً في Alpaca ويحذفها من القائمة.
@@ -433,15 +481,13 @@ def sync_with_alpaca(open_trades: list) -> list:
     if not open_trades:
         return open_trades
 
-    import pytz
-    from datetime import datetime, timezone, timedelta
     GRACE_SECONDS = 180  # 3 دقائق — وقت كافٍ لأي bracket order أن يُنفَّذ
 
     # ── جلب positions من Alpaca مع retry ×2
     alpaca_symbols = None
     for attempt in range(1, 3):
         try:
-            r = requests.get(
+            r = SESSION.get(
                 f"{ALPACA_BASE_URL}/v2/positions",
                 headers=HEADERS, timeout=10,
             )
@@ -478,20 +524,16 @@ def sync_with_alpaca(open_trades: list) -> list:
 
         # ── Grace period: تجاهل الصفقات الجديدة جداً
         try:
-            opened = trade.opened_at
-            if opened is not None:
-                if opened.tzinfo is None:
-                    opened = opened.replace(tzinfo=timezone.utc)
-                age_seconds = (now_utc - opened).total_seconds()
-                if age_seconds < GRACE_SECONDS:
-                    print(f"  ⏳ {trade.ticker}: غائبة عن Alpaca لكن فُتحت منذ {age_seconds:.0f}s — grace period ({GRACE_SECONDS}s)")
-                    continue
+            age_seconds = _trade_age_seconds(trade, now_utc)
+            if age_seconds is not None and age_seconds < GRACE_SECONDS:
+                print(f"  ⏳ {trade.ticker}: غائبة عن Alpaca لكن فُتحت منذ {age_seconds:.0f}s — grace period ({GRACE_SECONDS}s)")
+                continue
         except Exception:
             pass  # إذا فشل حساب الوقت — لا نحذف
 
         # ── تحقق مزدوج: هل هي مغلقة فعلاً؟
         try:
-            r2 = requests.get(
+            r2 = SESSION.get(
                 f"{ALPACA_BASE_URL}/v2/positions/{trade.ticker}",
                 headers=HEADERS, timeout=8,
             )
@@ -516,37 +558,80 @@ def sync_with_alpaca(open_trades: list) -> list:
 def get_current_price(ticker: str) -> float:
     """يجلب آخر سعر للسهم — snapshot API."""
     try:
-        response = requests.get(
+        response = SESSION.get(
             f"{ALPACA_DATA_URL}/v2/stocks/{ticker}/snapshot",
             headers=HEADERS,
             params={"feed": "iex"},
             timeout=10,
         )
         if response.status_code == 200:
-            data  = response.json()
-            price = float(
-                (data.get("latestTrade") or {}).get("p") or
-                (data.get("latestQuote") or {}).get("ap") or
-                (data.get("dailyBar")    or {}).get("c") or 0
-            )
+            price = _snapshot_price(response.json())
             if price > 0:
                 return round(price, 2)
     except Exception as e:
         print(f"❌ خطأ في جلب سعر {ticker}: {e}")
     return 0.0
 
+
+def _snapshot_price(snap: dict) -> float:
+    """آخر صفقة → آخر Ask → إغلاق الشمعة اليومية."""
+    return float(
+        (snap.get("latestTrade") or {}).get("p") or
+        (snap.get("latestQuote") or {}).get("ap") or
+        (snap.get("dailyBar")    or {}).get("c") or 0
+    )
+
+
+def get_current_prices(tickers: list) -> dict:
+    """
+    يجلب آخر سعر لعدة أسهم بطلب snapshots واحد بدلاً من طلب لكل سهم.
+    يُرجع {ticker: price} — السهم الغائب يعني فشل الجلب (استخدم get_current_price).
+    """
+    if not tickers:
+        return {}
+    prices = {}
+    try:
+        response = SESSION.get(
+            f"{ALPACA_DATA_URL}/v2/stocks/snapshots",
+            headers=HEADERS,
+            params={"symbols": ",".join(tickers), "feed": "iex"},
+            timeout=10,
+        )
+        if response.status_code == 200:
+            for symbol, snap in (response.json() or {}).items():
+                price = _snapshot_price(snap or {})
+                if price > 0:
+                    prices[symbol] = round(price, 2)
+        else:
+            print(f"⚠️  snapshots: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"❌ خطأ في جلب الأسعار المجمّعة: {e}")
+    return prices
+
 HEADERS = {
     "APCA-API-KEY-ID":     ALPACA_API_KEY,
     "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY,
     "Content-Type":        "application/json",
 }
 
+# ─── Session واحدة لكل طلبات Alpaca — تعيد استخدام اتصالات TCP/TLS
+# بدلاً من handshake جديد في كل requests.get/post (المراقبة كل 30 ثانية)
+# Retry لأخطاء الاتصال فقط — أمر POST لا يُعاد إرساله بعد وصوله للسيرفر (لا أوامر مكررة)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=2,    # api (trading) + data
+    pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.3),
+))
+
 
 # ─────────────────────────────────────────
 # نموذج الصفقة المفتوحة
 # ─────────────────────────────────────────
 
-@dataclass
+# slots=True: لا __dict__ لكل صفقة — وصول أسرع للحقول في حلقة المراقبة
+# ويمنع إنشاء حقل جديد بالخطأ (خطأ إملائي في اسم الحقل = AttributeError)
+@dataclass(slots=True)
 class OpenTrade:
     ticker:              str
     strategy:            str       # 'meanrev'
@@ -581,7 +666,7 @@ class OpenTrade:
 def get_account() -> dict:
     """يجلب معلومات حساب Alpaca."""
     try:
-        response = requests.get(
+        response = SESSION.get(
             f"{ALPACA_BASE_URL}/v2/account",
             headers=HEADERS,
             timeout=10,
@@ -607,31 +692,56 @@ def get_account() -> dict:
 # 2. التحقق من السوق
 # ─────────────────────────────────────────
 
-def is_market_open() -> bool:
-    """يتحقق إذا كان السوق مفتوحاً الآن عبر Alpaca Clock API."""
+# ─── Clock Cache — حالة السوق لا تتغير إلا عند next_open / next_close
+# الحلقة الرئيسية كانت تطلب /v2/clock كل 30 ثانية خارج ساعات التداول
+_clock_cache = {
+    "data":       None,   # آخر رد من /v2/clock
+    "valid_until": 0.0,   # timestamp — أول حد قادم (افتتاح أو إغلاق)
+}
+_CLOCK_MAX_TTL = 3600  # حد أقصى ساعة حتى لو الحد القادم أبعد (عطلة نهاية الأسبوع)
+
+
+def _get_clock() -> dict:
+    """
+    يُرجع رد Alpaca Clock مع caching حتى الحد القادم.
+    {} عند الفشل — لا نخزّن الفشل.
+    """
+    now = time.time()
+    if _clock_cache["data"] is not None and now < _clock_cache["valid_until"]:
+        return _clock_cache["data"]
+
     try:
-        response = requests.get(
+        response = SESSION.get(
             f"{ALPACA_BASE_URL}/v2/clock",
             headers=HEADERS,
             timeout=10,
         )
-        return response.json().get("is_open", False)
+        data = response.json()
+        if "is_open" not in data:
+            return {}
+
+        # الحد القادم: الإغلاق إذا كان السوق مفتوحاً، وإلا الافتتاح
+        boundary = data.get("next_close") if data.get("is_open") else data.get("next_open")
+        try:
+            until = datetime.fromisoformat(str(boundary)).timestamp()
+        except Exception:
+            until = now + 60
+        _clock_cache["data"]        = data
+        _clock_cache["valid_until"] = min(until, now + _CLOCK_MAX_TTL)
+        return data
     except Exception as e:
         print(f"❌ خطأ في التحقق من السوق: {e}")
-        return False
+        return {}
+
+
+def is_market_open() -> bool:
+    """يتحقق إذا كان السوق مفتوحاً الآن عبر Alpaca Clock API (مع cache)."""
+    return _get_clock().get("is_open", False)
 
 
 def get_next_market_open() -> str:
     """يُرجع وقت افتتاح السوق القادم."""
-    try:
-        response = requests.get(
-            f"{ALPACA_BASE_URL}/v2/clock",
-            headers=HEADERS,
-            timeout=10,
-        )
-        return response.json().get("next_open", "غير متاح")
-    except Exception:
-        return "غير متاح"
+    return _get_clock().get("next_open", "غير متاح")
 
 
 # ─────────────────────────────────────────
@@ -678,7 +788,7 @@ def place_bracket_order(
 
     # ── تحقق من عدم وجود مركز مفتوح مسبقاً (يمنع: bracket orders must be entry orders)
     try:
-        pos_r = requests.get(
+        pos_r = SESSION.get(
             f"{ALPACA_BASE_URL}/v2/positions/{ticker}",
             headers=HEADERS, timeout=8,
         )
@@ -701,7 +811,7 @@ def place_bracket_order(
         pass  # فشل التحقق — نكمل
 
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{ALPACA_BASE_URL}/v2/orders",
             headers=HEADERS,
             json=order,
@@ -765,7 +875,7 @@ def place_market_sell(ticker: str, quantity: int, side: str = "long") -> Optiona
     }
 
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{ALPACA_BASE_URL}/v2/orders",
             headers=HEADERS,
             json=order,
@@ -801,7 +911,7 @@ def update_stop_in_alpaca(ticker: str, new_stop: float, side: str, max_retries:
     for attempt in range(1, max_retries + 1):
         try:
             # ── 1. جلب كل الأوامر المفتوحة لهذا السهم
-            r = requests.get(
+            r = SESSION.get(
                 f"{ALPACA_BASE_URL}/v2/orders",
                 headers=HEADERS,
                 params={"status": "open", "symbols": ticker, "limit": 50},
@@ -816,7 +926,7 @@ def update_stop_in_alpaca(ticker: str, new_stop: float, side: str, max_retries:
                 order_id = o.get("id", "")
                 if not order_id:
                     continue
-                del_r = requests.delete(
+                del_r = SESSION.delete(
                     f"{ALPACA_BASE_URL}/v2/orders/{order_id}",
                     headers=HEADERS, timeout=10,
                 )
@@ -833,7 +943,7 @@ def update_stop_in_alpaca(ticker: str, new_stop: float, side: str, max_retries:
                 time.sleep(0.5)  # انتظر حتى تُعالَج الإلغاءات
 
             # ── 3. جلب الكمية الفعلية من Alpaca
-            r2 = requests.get(
+            r2 = SESSION.get(
                 f"{ALPACA_BASE_URL}/v2/positions/{ticker}",
                 headers=HEADERS, timeout=10,
             )
@@ -854,7 +964,7 @@ def update_stop_in_alpaca(ticker: str, new_stop: float, side: str, max_retries:
                 "stop_price":    str(round(new_stop, 2)),
                 "time_in_force": "day",
             }
-            resp = requests.post(
+            resp = SESSION.post(
                 f"{ALPACA_BASE_URL}/v2/orders",
                 headers=HEADERS, json=order, timeout=15,
             )
@@ -889,7 +999,7 @@ def _check_stop_not_at_breakeven(ticker: str, breakeven: float, side: str) -> bo
     يُرجع True إذا يحتاج تحديث، False إذا هو بالفعل عند breakeven أو أفضل.
     """
     try:
-        r = requests.get(
+        r = SESSION.get(
             f"{ALPACA_BASE_URL}/v2/orders",
             headers=HEADERS,
             params={"status": "open", "symbols": ticker, "limit": 50},
@@ -919,40 +1029,54 @@ def _check_stop_not_at_breakeven(ticker: str, breakeven: float, side: str) -> bo
         return False
 
 
-def sync_trade_state_with_alpaca(trade) -> bool:
+def get_positions_map() -> Optional[dict]:
+    """
+    كل المراكز المفتوحة في Alpaca بطلب واحد: {symbol: position}.
+    None عند الفشل — المستدعي يرجع للطلب الفردي لكل صفقة.
+    """
+    try:
+        r = SESSION.get(f"{ALPACA_BASE_URL}/v2/positions", headers=HEADERS, timeout=10)
+        if r.status_code != 200:
+            return None
+        return {pos.get("symbol", ""): pos for pos in r.json()}
+    except Exception as e:
+        print(f"  ⚠️  get_positions_map: {e}")
+        return None
+
+
+def sync_trade_state_with_alpaca(trade, position: Optional[dict] = None) -> bool:
     """
     أهم دالة — تُشغَّل قبل كل دورة مراقبة:
     - تكتشف TP1 تلقائياً إذا أغلق Alpaca النصف بنفسه
     - تحدّث quantity_remaining
     - تحرّك SL إلى breakeven في Alpaca فعلياً
 
+    position: المركز من get_positions_map() إن وُجد — يوفّر طلب HTTP لكل صفقة.
+    None = طلب مباشر (ويشمل حالة 404 والـ grace period).
+
     Grace period: إذا الصفقة فُتحت منذ أقل من 3 دقائق ولم تظهر بعد
     في positions (bracket pending) — لا نحذفها.
     """
-    from datetime import datetime, timezone
-
     GRACE_SECONDS = 180  # 3 دقائق
 
     try:
-        r = requests.get(f"{ALPACA_BASE_URL}/v2/positions/{trade.ticker}", headers=HEADERS, timeout=10)
-        if r.status_code == 404:
-            # ── تحقق من grace period قبل الحكم بالإغلاق
-            try:
-                opened = trade.opened_at
-                if opened is not None:
-                    if opened.tzinfo is None:
-                        opened = opened.replace(tzinfo=timezone.utc)
-                    age = (datetime.now(timezone.utc) - opened).total_seconds()
-                    if age < GRACE_SECONDS:
+        if position is None:
+            r = SESSION.get(f"{ALPACA_BASE_URL}/v2/positions/{trade.ticker}", headers=HEADERS, timeout=10)
+            if r.status_code == 404:
+                # ── تحقق من grace period قبل الحكم بالإغلاق
+                try:
+                    age = _trade_age_seconds(trade, datetime.now(timezone.utc))
+                    if age is not None and age < GRACE_SECONDS:
                         print(f"  ⏳ {trade.ticker}: 404 لكن فُتحت منذ {age:.0f}s — grace period، لا حذف")
                         return True  # treat as still open
-            except Exception:
-                pass
-            return False  # الصفقة مغلقة بالكامل
-        if r.status_code != 200:
-            return True   # خطأ مؤقت — لا تغيّر شيء
+                except Exception:
+                    pass
+                return False  # الصفقة مغلقة بالكامل
+            if r.status_code != 200:
+                return True   # خطأ مؤقت — لا تغيّر شيء
+            position = r.json()
 
-        actual_qty = abs(int(float(r.json().get("qty", 0))))
+        actual_qty = abs(int(float(position.get("qty", 0))))
 
         if actual_qty == 0:
             return False  # مغلقة
@@ -1051,7 +1175,7 @@ def sync_trade_state_with_alpaca(trade) -> bool:
 def cancel_order(order_id: str) -> bool:
     """يلغي أمراً معلقاً."""
     try:
-        response = requests.delete(
+        response = SESSION.delete(
             f"{ALPACA_BASE_URL}/v2/orders/{order_id}",
             headers=HEADERS,
             timeout=10,
@@ -1070,7 +1194,7 @@ def _get_order_filled_qty(order_id: str) -> tuple:
     يُستخدم لاكتشاف Partial Fill ومنع الخلط مع TP1.
     """
     try:
-        r = requests.get(
+        r = SESSION.get(
             f"{ALPACA_BASE_URL}/v2/orders/{order_id}",
             headers=HEADERS, timeout=10,
         )
@@ -1201,7 +1325,7 @@ def open_meanrev_trade(
 # 5. مراقبة الصفقات المفتوحة
 # ─────────────────────────────────────────
 
-def monitor_trade(trade: OpenTrade) -> dict:
+def monitor_trade(trade: OpenTrade, current_price: Optional[float] = None) -> dict:
     """
     يراقب الصفقة المفتوحة ويتحقق من:
     - هل ضُرب وقف الخسارة؟
@@ -1215,8 +1339,11 @@ def monitor_trade(trade: OpenTrade) -> dict:
     - r        : نسبة R الحالية
     - new_stop : الوقف الجديد عند التحديث
     - exit_qty : الكمية المراد إغلاقها
+
+    current_price: سعر مجلوب مسبقاً (get_current_prices) — None = جلب مباشر
     """
-    current_price = get_current_price(trade.ticker)
+    if current_price is None:
+        current_price = get_current_price(trade.ticker)
     if current_price <= 0:
         return {"status": "open", "price": 0, "r": 0,
                 "new_stop": trade.stop_loss, "exit_qty": 0}
@@ -1289,7 +1416,7 @@ def close_all_positions() -> bool:
 
     # ── الخطوة 1: إلغاء كل الأوامر المعلّقة
     try:
-        r1 = requests.delete(
+        r1 = SESSION.delete(
             f"{ALPACA_BASE_URL}/v2/orders",
             headers=HEADERS, timeout=15,
         )
@@ -1305,7 +1432,7 @@ def close_all_positions() -> bool:
 
     # ── الخطوة 2: إغلاق كل الـ positions
     try:
-        r2 = requests.delete(
+        r2 = SESSION.delete(
             f"{ALPACA_BASE_URL}/v2/positions",
             headers=HEADERS, timeout=15,
         )
@@ -1320,7 +1447,7 @@ def close_all_positions() -> bool:
 
     # ── الخطوة 3: تحقق نهائي
     try:
-        r3 = requests.get(
+        r3 = SESSION.get(
             f"{ALPACA_BASE_URL}/v2/positions",
             headers=HEADERS, timeout=10,
         )
@@ -1336,7 +1463,7 @@ def close_all_positions() -> bool:
                 for pos in remaining:
                     sym = pos.get("symbol", "")
                     try:
-                        r_single = requests.delete(
+                        r_single = SESSION.delete(
                             f"{ALPACA_BASE_URL}/v2/positions/{sym}",
                             headers=HEADERS, timeout=10,
                         )
@@ -1,6 +1,6 @@
 # =============================================================
 # main.py -- المحرك الرئيسي للنظام
-# Loop كل 30 ثانية + pytz لقراءة وقت نيويورك (EST/EDT تلقائياً)
+# Loop كل 30 ثانية + zoneinfo لقراءة وقت نيويورك (EST/EDT تلقائياً)
 # يدعم أوامر Telegram: /maintenance /resume /status /stop /help
 # =============================================================
 
@@ -10,23 +10,27 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import time
 import traceback
-import pytz
-from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from datetime import datetime
 
 from config import (
+    ALPACA_API_KEY,
+    ALPACA_SECRET_KEY,
     TIMEZONE,
     MARKET_OPEN,
     MARKET_CLOSE,
     NO_OPPORTUNITY_INTERVAL,
     MAX_TOTAL,
 )
-from universe         import get_daily_universe
+from universe         import get_daily_universe, universe_age_min
 from selector         import run_selector
 from executor         import (
     get_account,
     get_next_market_open,
     get_current_price,
+    get_current_prices,
     get_open_positions,
+    get_positions_map,
     sync_with_alpaca,
     sync_trade_state_with_alpaca,
     update_stop_in_alpaca,
@@ -57,7 +61,7 @@ from telegram_commands import (
     notify_error,
 )
 
-TZ = pytz.timezone(TIMEZONE)
+TZ = ZoneInfo(TIMEZONE)
 
 # -----------------------------------------
 # الحالة العامة للنظام
@@ -66,11 +70,14 @@ TZ = pytz.timezone(TIMEZONE)
 risk_manager : DailyRiskManager = DailyRiskManager()
 open_trades  : list              = []
 daily_stocks : dict              = {}
-last_no_opp  : datetime          = datetime.now(TZ) - timedelta(hours=2)
-last_scan    : datetime          = datetime.now(TZ) - timedelta(hours=2)
-last_universe_refresh : datetime = datetime.now(TZ) - timedelta(hours=2)
+# توقيت الفحص بـ time.monotonic() — لا يتأثر بتعديل ساعة النظام
+last_no_opp  : float             = time.monotonic() - 2 * 3600
+last_scan    : float             = time.monotonic() - 2 * 3600
 SCAN_INTERVAL_MIN     : int      = 5    # فحص الإشارات كل 5 دقائق
 UNIVERSE_REFRESH_MIN  : int      = 60   # تحديث قائمة الأسهم كل ساعة
+LOOP_SECONDS          : int      = 30   # دورة الحلقة أثناء الجلسة
+IDLE_SLEEP_MAX        : int      = 300  # أقصى نوم خارج الجلسة (بعد الإغلاق / عطلة)
+PRICES_MAX_AGE_SEC    : float    = 3.0  # إعادة جلب الأسعار أثناء المراقبة إذا تقادمت
 
 _pre_market_done  : bool = False
 _pre_alert_done   : bool = False
@@ -95,47 +102,63 @@ def get_ny_time() -> datetime:
     return datetime.now(TZ)
 
 
-def is_weekday() -> bool:
-    return get_ny_time().weekday() < 5
+# كل دوال النوافذ تقبل now اختيارياً — الحلقة الرئيسية تقرأ الوقت مرة واحدة
+# وتمرّره للجميع بدلاً من datetime.now + strftime في كل فحص
 
+def is_weekday(now: datetime = None) -> bool:
+    return (now or get_ny_time()).weekday() < 5
 
-def is_pre_market_alert_time() -> bool:
+
+def _weekday_hhmm(now: datetime = None) -> str:
+    """'HH:MM' بتوقيت نيويورك — أو '' في عطلة نهاية الأسبوع."""
+    now = now or get_ny_time()
+    return now.strftime("%H:%M") if now.weekday() < 5 else ""
+
+
+def is_pre_market_alert_time(now: datetime = None) -> bool:
     """09:00 → رسالة تنبيه فقط 'السوق يفتح بعد 30 دقيقة'"""
-    if not is_weekday():
-        return False
-    t = get_ny_time().strftime("%H:%M")
-    return "09:00" <= t < "09:05"
+    t = _weekday_hhmm(now)
+    return bool(t) and "09:00" <= t < "09:05"
 
 
-def is_pre_market_time() -> bool:
+def is_pre_market_time(now: datetime = None) -> bool:
     """09:35 → تشغيل Pre-Market الفعلي (اختيار الأسهم)"""
-    if not is_weekday():
-        return False
-    t = get_ny_time().strftime("%H:%M")
-    return "09:35" <= t < "09:45"
+    t = _weekday_hhmm(now)
+    return bool(t) and "09:35" <= t < "09:45"
 
 
-def is_market_hours() -> bool:
-    if not is_weekday():
-        return False
-    t = get_ny_time().strftime("%H:%M")
-    return MARKET_OPEN <= t <= MARKET_CLOSE
+def is_market_hours(now: datetime = None) -> bool:
+    t = _weekday_hhmm(now)
+    return bool(t) and MARKET_OPEN <= t <= MARKET_CLOSE
 
 
-def is_close_time() -> bool:
+def is_close_time(now: datetime = None) -> bool:
     """
     يُرجع True فقط في نافذة إغلاق السوق: 15:45 → 16:05
     بعد 16:05 يُرجع False لتجنب إرسال التقرير عند كل Deploy.
     """
-    if not is_weekday():
-        return False
-    t = get_ny_time().strftime("%H:%M")
-    return MARKET_CLOSE <= t <= "16:05"
+    t = _weekday_hhmm(now)
+    return bool(t) and MARKET_CLOSE <= t <= "16:05"
+
+
+def idle_sleep_seconds(now: datetime) -> int:
+    """
+    خارج ساعات التداول لا يوجد عمل كل 30 ثانية —
+    ننام حتى النافذة القادمة (09:00 / 09:35 / الافتتاح / الإغلاق) بحد أقصى 5 دقائق.
+    """
+    if now.weekday() < 5:
+        for hhmm in ("09:00", "09:35", MARKET_OPEN, MARKET_CLOSE):
+            h, m   = map(int, hhmm.split(":"))
+            target = now.replace(hour=h, minute=m, second=0, microsecond=0)
+            secs   = (target - now).total_seconds()
+            if secs > 0:
+                return int(max(LOOP_SECONDS, min(IDLE_SLEEP_MAX, secs)))
+    return IDLE_SLEEP_MAX
 
 
-def check_new_day():
+def check_new_day(now: datetime = None):
     global _pre_market_done, _close_done, _current_day, _pre_alert_done
-    today = get_ny_time().strftime("%Y-%m-%d")
+    today = (now or get_ny_time()).strftime("%Y-%m-%d")
     if today != _current_day:
         _current_day     = today
         _pre_market_done = False
@@ -190,7 +213,8 @@ def run_pre_market():
     # ── محاولة جلب الأسهم مع retry ×3
     for attempt in range(1, 4):
         try:
-            daily_stocks = get_daily_universe()
+            # بعد إعادة تشغيل أثناء الجلسة: قائمة أحدث من ساعة تُستخدم من الـ disk
+            daily_stocks = get_daily_universe(max_cache_age_min=UNIVERSE_REFRESH_MIN)
             if daily_stocks:
                 refresh_allowed_tickers(candidate_tickers=list(daily_stocks.keys()))
                 break
@@ -255,16 +279,29 @@ def monitor_open_trades():
     log(f"Monitoring {len(open_trades)} open trades...")
     trades_to_remove = []
 
-    for trade in open_trades:
+    # ── أسعار ومراكز كل الصفقات بطلب واحد لكلٍّ منهما بدلاً من طلبين لكل صفقة
+    prices     = get_current_prices([t.ticker for t in open_trades])
+    positions  = get_positions_map() or {}
+    fetched_at = time.monotonic()
+
+    for i, trade in enumerate(open_trades):
         try:
+            # ── أوامر صفقة سابقة (إلغاء / استبدال الوقف مع sleep) قد تستغرق ثواني
+            # → لا نحكم على الصفقات التالية بأسعار قديمة؛ نعيد الجلب للمتبقية فقط
+            if time.monotonic() - fetched_at > PRICES_MAX_AGE_SEC:
+                remaining  = [t.ticker for t in open_trades[i:]]
+                prices     = get_current_prices(remaining)
+                positions  = get_positions_map() or positions
+                fetched_at = time.monotonic()
+
             # ── تزامن مع Alpaca أولاً (يكتشف TP1 تلقائي + يحدث الكمية)
-            still_open = sync_trade_state_with_alpaca(trade)
+            still_open = sync_trade_state_with_alpaca(trade, position=positions.get(trade.ticker))
             if not still_open:
                 log(f"  ℹ️  {trade.ticker}: مغلقة في Alpaca — إزالة")
                 trades_to_remove.append(trade)
                 continue
 
-            result = monitor_trade(trade)
+            result = monitor_trade(trade, current_price=prices.get(trade.ticker))
             status = result["status"]
             price  = result["price"]
             r      = result["r"]
@@ -474,10 +511,9 @@ def monitor_open_trades():
 # -----------------------------------------
 
 def refresh_universe_if_needed():
-    global daily_stocks, last_universe_refresh
-    now  = get_ny_time()
-    mins = (now - last_universe_refresh).total_seconds() / 60
-    if mins < UNIVERSE_REFRESH_MIN:
+    global daily_stocks
+    # عمر القائمة يُتتبَّع في universe.py — يشمل ما حُمّل في Pre-Market أو من الـ cache
+    if universe_age_min() < UNIVERSE_REFRESH_MIN:
         return
     try:
         log("🔄 تحديث قائمة الأسهم (كل ساعة)...")
@@ -485,7 +521,6 @@ def refresh_universe_if_needed():
         if new_stocks:
             daily_stocks = new_stocks
             refresh_allowed_tickers(candidate_tickers=list(daily_stocks.keys()))
-            last_universe_refresh = now
             log(f"✅ تم تحديث القائمة: {len(daily_stocks)} سهم")
         else:
             log("⚠️ فشل تحديث القائمة — نبقى على القائمة الحالية")
@@ -504,8 +539,8 @@ def scan_for_signals():
         return
 
     # ── تحقق من الفترة الزمنية — لا تفحص أكثر من مرة كل 5 دقائق
-    now  = get_ny_time()
-    mins = (now - last_scan).total_seconds() / 60
+    now  = time.monotonic()
+    mins = (now - last_scan) / 60
     if mins < SCAN_INTERVAL_MIN:
         return
 
@@ -518,19 +553,16 @@ def scan_for_signals():
 
         # ── current_positions: من الذاكرة + Alpaca مباشرة (يمنع bracket مكرر)
         current_positions = {t.ticker: (t.side, t.strategy) for t in open_trades}
-        try:
-            from executor import ALPACA_BASE_URL, HEADERS
-            import requests as _req
-            _pos_r = _req.get(f"{ALPACA_BASE_URL}/v2/positions", headers=HEADERS, timeout=8)
-            if _pos_r.status_code == 200:
-                for _pos in _pos_r.json():
-                    _sym = _pos.get("symbol", "")
-                    if _sym and _sym not in current_positions:
-                        _alpaca_side = "long" if _pos.get("side") == "long" else "short"
-                        current_positions[_sym] = (_alpaca_side, "unknown")
-                        log(f"  ⚠️  {_sym} موجود في Alpaca لكن ليس في الذاكرة — مستثنى من الفحص")
-        except Exception as _e:
-            log(f"  ⚠️  تعذّر جلب positions من Alpaca: {_e}")
+        # get_positions_map: Session المشتركة + Retry — None عند الفشل
+        alpaca_positions = get_positions_map()
+        if alpaca_positions is None:
+            log("  ⚠️  تعذّر جلب positions من Alpaca")
+        else:
+            for _sym, _pos in alpaca_positions.items():
+                if _sym and _sym not in current_positions:
+                    _alpaca_side = "long" if _pos.get("side") == "long" else "short"
+                    current_positions[_sym] = (_alpaca_side, "unknown")
+                    log(f"  ⚠️  {_sym} موجود في Alpaca لكن ليس في الذاكرة — مستثنى من الفحص")
         balance           = account["balance"]
         results           = run_selector(daily_stocks, current_positions=current_positions)
         found_signal      = False
@@ -565,8 +597,8 @@ def scan_for_signals():
                     log(f"Telegram error: {e}")
 
         if not found_signal:
-            now  = get_ny_time()
-            diff = (now - last_no_opp).total_seconds() / 60
+            now  = time.monotonic()
+            diff = (now - last_no_opp) / 60
             if diff >= NO_OPPORTUNITY_INTERVAL:
                 try:
                     notify_no_opportunity()
@@ -598,8 +630,9 @@ def run_market_close():
         open_trades_summary = []
         if open_trades:
             log(f"{len(open_trades)} open trade(s) will carry over to next session:")
+            prices = get_current_prices([t.ticker for t in open_trades])
             for trade in open_trades:
-                price = get_current_price(trade.ticker)
+                price = prices.get(trade.ticker) or get_current_price(trade.ticker)
                 if price > 0 and trade.stop_loss != trade.entry_price:
                     if trade.side == "long":
                         r = round((price - trade.entry_price) / abs(trade.entry_price - trade.stop_loss), 2)
@@ -641,6 +674,12 @@ def main():
     log("Commands: /maintenance /resume /status /help")
     log("=" * 55)
 
+    # ── مفاتيح Alpaca غير موجودة = لا فائدة من محاولة الاتصال كل 60 ثانية للأبد
+    # نخرج فوراً بكود غير صفري ليظهر الخطأ في Render
+    if not ALPACA_API_KEY or not ALPACA_SECRET_KEY:
+        log("❌ ALPACA_API_KEY / ALPACA_SECRET_KEY missing -- check Environment Variables")
+        sys.exit(2)
+
     # الاتصال بـ Alpaca
     log("Connecting to Alpaca...")
     while True:
@@ -673,24 +712,29 @@ def main():
 
     # الحلقة الرئيسية
     while True:
+        cycle_start = time.monotonic()
+        sleep_for   = LOOP_SECONDS
         try:
             # إذا كان في وضع الصيانة
+            # ننام حتى /resume مباشرة — استيقاظ كل IDLE_SLEEP_MAX فقط للتسجيل
             if system_state.maintenance_mode:
-                log("MAINTENANCE MODE -- trading paused")
-                time.sleep(30)
+                log("MAINTENANCE MODE -- trading paused (waiting for /resume)")
+                if system_state.wait_for_resume(timeout=IDLE_SLEEP_MAX):
+                    log("Resumed from maintenance")
                 continue
 
             # التشغيل الطبيعي
-            check_new_day()
-            t = get_ny_time().strftime("%H:%M")
+            now = get_ny_time()
+            check_new_day(now)
+            t = now.strftime("%H:%M")
 
-            if is_pre_market_alert_time() and not _pre_alert_done:
+            if is_pre_market_alert_time(now) and not _pre_alert_done:
                 run_pre_market_alert()
 
-            elif is_pre_market_time() and not _pre_market_done:
+            elif is_pre_market_time(now) and not _pre_market_done:
                 run_pre_market()
 
-            elif is_market_hours():
+            elif is_market_hours(now):
                 if not risk_manager.can_trade():
                     log("System paused -- daily loss limit reached")
                 elif not daily_stocks and not _pre_market_done:
@@ -710,12 +754,13 @@ def main():
                 else:
                     log("No universe -- waiting for pre-market routine")
 
-            elif is_close_time() and not _close_done:
+            elif is_close_time(now) and not _close_done:
                 run_market_close()
 
             else:
-                day_str = "Weekend" if not is_weekday() else "After hours"
-                log(f"{day_str} | {t} {TIMEZONE} | Next open: {get_next_market_open()}")
+                day_str   = "Weekend" if not is_weekday(now) else "After hours"
+                sleep_for = idle_sleep_seconds(now)
+                log(f"{day_str} | {t} {TIMEZONE} | Next open: {get_next_market_open()} | sleep {sleep_for}s")
 
             # إعادة ضبط عداد الأخطاء عند نجاح الدورة
             if _consecutive_errors > 0:
@@ -738,7 +783,8 @@ def main():
                 notify_error(str(e))
                 _error_notified = True
 
-        time.sleep(30)
+        # نطرح زمن الدورة نفسها — الإيقاع يبقى ثابتاً ولا ينجرف بطول المسح
+        time.sleep(max(0.0, sleep_for - (time.monotonic() - cycle_start)))
 
 
 if __name__ == "__main__":
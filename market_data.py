@@ -0,0 +1,201 @@
+# =============================================================
+# market_data.py — طبقة جلب بيانات Alpaca المشتركة
+# Session واحدة + حد المعدل + تحويل الشموع إلى DataFrame
+# تستخدمها MeanRev و Momentum و selector بدلاً من طلبات HTTP منفصلة
+# =============================================================
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
+import time
+from operator import itemgetter
+import pandas as pd
+import numpy as np
+
+from config import (
+    ALPACA_API_KEY,
+    ALPACA_SECRET_KEY,
+    ALPACA_DATA_URL,
+    ALPACA_DATA_MAX_RPS,
+)
+
+HEADERS = {
+    "APCA-API-KEY-ID":      ALPACA_API_KEY,
+    "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY,
+}
+
+# ─── Session واحدة لكل طلبات Data API (شموع + أخبار) من كل threads التحليل
+# keep-alive بدلاً من TLS handshake لكل طلب؛ الـ pool يتسع لكل الـ workers
+# Retry لأخطاء الاتصال فقط — 429 / 5xx تعالجها request_bars بنفسها
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3),
+))
+
+# إعادة المحاولة للأخطاء المؤقتة فقط (429 / 5xx / شبكة)
+FETCH_RETRIES     = 2
+FETCH_RETRY_DELAY = 1.0
+
+# ─── حد معدل طلبات Data API — مشترك بين كل threads التحليل
+# كل طلب يحجز "موعداً" بفاصل 1/ALPACA_DATA_MAX_RPS — توزيع منتظم بدلاً من انفجار ثم 429
+_rate_lock      = threading.Lock()
+_rate_next_slot = 0.0
+
+
+def throttle_data_request():
+    """ينتظر حتى موعد الطلب التالي المسموح به — يُستدعى قبل كل طلب لـ Data API."""
+    global _rate_next_slot
+    with _rate_lock:
+        now             = time.monotonic()
+        wait            = _rate_next_slot - now
+        _rate_next_slot = max(now, _rate_next_slot) + 1.0 / ALPACA_DATA_MAX_RPS
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _get_with_retry(url: str, params: dict, timeout: int, label: str) -> requests.Response | None:
+    """
+    GET عبر SESSION مع حد المعدل — يعيد المحاولة فقط للأخطاء المؤقتة (429 / 5xx / انقطاع الشبكة).
+    يُرجع الرد (قد يكون 4xx — يفحصه المستدعي) أو None بعد استنفاد المحاولات.
+    تحليل JSON خارج هذه الدالة عمداً: رد غير صالح ليس خطأ شبكة ولا تفيده الإعادة.
+    """
+    for attempt in range(FETCH_RETRIES + 1):
+        try:
+            throttle_data_request()
+            response = SESSION.get(url, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            # timeout / انقطاع اتصال — مؤقت غالباً
+            if attempt < FETCH_RETRIES:
+                time.sleep(FETCH_RETRY_DELAY * (attempt + 1))
+                continue
+            print(f"❌ خطأ في جلب بيانات {label}: {e}")
+            return None
+
+        if response.status_code == 429 or response.status_code >= 500:
+            if attempt < FETCH_RETRIES:
+                time.sleep(FETCH_RETRY_DELAY * (attempt + 1))
+                continue
+            print(f"⚠️  {label}: HTTP {response.status_code} بعد {FETCH_RETRIES + 1} محاولات")
+            return None
+
+        return response
+
+    return None
+
+
+def request_bars(ticker: str, timeframe: str, start: str, end: str, bar_limit: int) -> pd.DataFrame:
+    """
+    طلب الشموع من Alpaca وتحويلها إلى DataFrame — فارغ عند الفشل.
+    يعيد المحاولة فقط للأخطاء المؤقتة (429 / 5xx / انقطاع الشبكة).
+    """
+    response = _get_with_retry(
+        f"{ALPACA_DATA_URL}/v2/stocks/{ticker}/bars",
+        params={
+            "timeframe": timeframe,
+            "start":     start,
+            "end":       end,
+            "limit":     bar_limit,
+            "feed":      "iex",
+        },
+        timeout=15,
+        label=f"{ticker} [{timeframe}]",
+    )
+    if response is None:
+        return pd.DataFrame()
+
+    try:
+        return bars_to_df(response.json().get("bars") or [])
+    except (ValueError, KeyError) as e:
+        # رد غير JSON أو بشكل غير متوقع — الإعادة لن تفيد
+        print(f"❌ رد غير صالح لـ {ticker} [{timeframe}]: {e}")
+        return pd.DataFrame()
+
+
+def request_bars_batch(tickers: list, timeframe: str, start: str, end: str, batch_size: int = 100) -> dict:
+    """
+    يجلب الشموع لعدة أسهم عبر endpoint الـ multi-symbol — طلب لكل 100 سهم (+ صفحات إضافية).
+    ملاحظة: limit في هذا الـ endpoint إجمالي لكل الرموز — لذلك نتبع next_page_token.
+
+    يُرجع {ticker: DataFrame} — السهم الغائب يعني فشل الجلب.
+    الدفعة التي تفشل أي صفحة منها تُسقط كاملة — لا تاريخ مبتور يبدو كجلب ناجح.
+    """
+    raw: dict = {}
+
+    for i in range(0, len(tickers), batch_size):
+        batch      = tickers[i:i + batch_size]
+        label      = f"الشموع المجمّعة ({len(batch)} سهم) [{timeframe}]"
+        page_token = None
+        # الصفحات مرتبة بالسهم ثم بالزمن — فشل صفحة لاحقة يترك سهم الحدود بأقدم شموعه فقط
+        # لذلك لا يُدمج شيء من الدفعة إلا بعد اكتمال كل صفحاتها بنجاح
+        batch_raw: dict = {}
+        complete        = False
+
+        while True:
+            params = {
+                "symbols":   ",".join(batch),
+                "timeframe": timeframe,
+                "start":     start,
+                "end":       end,
+                "limit":     10000,
+                "feed":      "iex",
+            }
+            if page_token:
+                params["page_token"] = page_token
+
+            response = _get_with_retry(f"{ALPACA_DATA_URL}/v2/stocks/bars", params, 20, label)
+            if response is None:
+                break
+            if response.status_code != 200:
+                print(f"⚠️  {label}: HTTP {response.status_code}")
+                break
+            try:
+                data = response.json()
+            except ValueError as e:
+                print(f"❌ رد غير صالح — {label}: {e}")
+                break
+
+            for symbol, bars in (data.get("bars") or {}).items():
+                batch_raw.setdefault(symbol, []).extend(bars)
+
+            page_token = data.get("next_page_token")
+            if not page_token:
+                complete = True
+                break
+
+        if complete:
+            raw.update(batch_raw)
+        else:
+            # الدفعة كاملة تُعتبر فاشلة → أسهمها غائبة وتأخذ مسار الجلب الفردي
+            print(f"⚠️  {label}: جلب غير مكتمل — تجاهل الدفعة")
+
+    return {symbol: bars_to_df(bars) for symbol, bars in raw.items()}
+
+
+_BAR_FIELDS = itemgetter("t", "o", "h", "l", "c", "v")
+
+
+def bars_to_df(bars: list) -> pd.DataFrame:
+    """يحوّل قائمة شموع Alpaca الخام إلى DataFrame مرتب زمنياً."""
+    if not bars:
+        return pd.DataFrame()
+
+    # بناء عمودي مباشر — بدل pd.DataFrame(list of dicts) ثم rename (نسخ وسيطة لكل سهم)
+    t, o, h, l, c, v = zip(*map(_BAR_FIELDS, bars))
+    t = np.asarray(t)
+    df = pd.DataFrame({
+        "t":      t,
+        "open":   np.asarray(o, dtype=np.float64),
+        "high":   np.asarray(h, dtype=np.float64),
+        "low":    np.asarray(l, dtype=np.float64),
+        "close":  np.asarray(c, dtype=np.float64),
+        "volume": np.asarray(v, dtype=np.int64),
+        "time":   pd.to_datetime(t),
+    })
+    # Alpaca تُرجع الشموع مرتبة أصلاً — الفرز وإعادة بناء الـ index فقط عند الحاجة
+    if not df["time"].is_monotonic_increasing:
+        df = df.sort_values("time").reset_index(drop=True)
+    return df
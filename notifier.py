@@ -4,31 +4,153 @@
 # =============================================================
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import queue
+import heapq
+import threading
+import atexit
+import time
 from datetime import datetime
 from config import TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, TIMEZONE
-import pytz
-
-TZ = pytz.timezone(TIMEZONE)
+from zoneinfo import ZoneInfo
+
+TZ = ZoneInfo(TIMEZONE)
+
+# Session واحدة لكل رسائل Telegram — اتصال keep-alive مع api.telegram.org
+# بدلاً من TLS handshake جديد لكل إشعار (فتح/وقف/TP لكل صفقة)
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=2,
+    max_retries=Retry(total=2, backoff_factor=0.3),
+))
+
+# ─── طابور الإرسال — الحلقة الرئيسية لا تنتظر رد Telegram
+# الرسائل تُرسل بالترتيب من thread خلفي واحد؛ عند الامتلاء تُسقط الرسالة بدلاً من الحجب
+_QUEUE_MAX    = 256
+# الرسائل المتتالية خلال نافذة قصيرة تُدمج في رسالة واحدة (حد Telegram = 4096 حرف)
+_COALESCE_WINDOW = 0.5
+_COALESCE_MAX    = 10
+_MAX_MESSAGE_LEN = 4000
+_SEPARATOR       = "\n\n➖➖➖➖➖➖➖➖➖➖\n\n"
+_queue        = queue.Queue(maxsize=_QUEUE_MAX)
+_worker       = None
+_worker_lock  = threading.Lock()
+_dropped      = 0
 
 
 def _send(message: str) -> bool:
+    """يضع الرسالة في طابور الإرسال ويعود فوراً — True إذا قُبلت."""
+    global _dropped
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         print("Telegram not configured -- check .env")
         return False
-    url     = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": "HTML"}
+    _ensure_worker()
+    try:
+        _queue.put_nowait(message)
+        return True
+    except queue.Full:
+        _dropped += 1
+        print(f"⚠️  Telegram queue full -- dropped message (total dropped: {_dropped})")
+        return False
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, daemon=True, name="telegram-sender")
+            _worker.start()
+
+
+def _worker_loop():
+    while True:
+        batch = [_queue.get()]
+        size  = len(batch[0])
+        # ── ندمج ما يصل خلال النافذة — فتح صفقة + وقف + تقرير = طلب HTTP واحد
+        while len(batch) < _COALESCE_MAX:
+            try:
+                message = _queue.get(timeout=_COALESCE_WINDOW)
+            except queue.Empty:
+                break
+            if size + len(_SEPARATOR) + len(message) > _MAX_MESSAGE_LEN:
+                # لا تتسع — نرسل الدفعة الحالية ونبدأ دفعة جديدة بهذه الرسالة
+                _flush_batch(batch)
+                batch, size = [message], len(message)
+                continue
+            batch.append(message)
+            size += len(_SEPARATOR) + len(message)
+        _flush_batch(batch)
+
+
+def _flush_batch(batch: list):
     try:
-        response = requests.post(url, json=payload, timeout=10)
-        return response.status_code == 200
+        status = _post(_SEPARATOR.join(batch))
+        if status == 200:
+            return
+        if len(batch) == 1:
+            _log_failure(status, batch[0])
+            return
+        # ── فشل الطلب المدمج (HTML غير صالح في رسالة واحدة مثلاً) → نعيد كل رسالة منفردة
+        # حتى لا تضيع إشعارات الصفقات بسبب رسالة لا علاقة لها بها
+        print(f"⚠️  Telegram batch of {len(batch)} failed (HTTP {status}) -- resending individually")
+        for message in batch:
+            status = _post(message)
+            if status != 200:
+                _log_failure(status, message)
+    finally:
+        for _ in batch:
+            _queue.task_done()
+
+
+def flush(timeout: float = 10.0):
+    """ينتظر إرسال الرسائل المعلقة (بحد أقصى timeout) — يُستدعى تلقائياً عند الخروج."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+
+atexit.register(flush)
+
+
+# الرابط وحقول الطلب الثابتة تُبنى مرة واحدة — لا تتغير طوال عمر العملية
+_SEND_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+_PAYLOAD  = {"chat_id": TELEGRAM_CHAT_ID, "parse_mode": "HTML", "text": ""}
+
+
+def _post(message: str) -> int:
+    """يرسل الرسالة ويُرجع HTTP status (0 عند خطأ اتصال/timeout)."""
+    # الإرسال من thread واحد فقط (_worker_loop) — تعديل _PAYLOAD في مكانه آمن
+    _PAYLOAD["text"] = message
+    try:
+        response = _session.post(_SEND_URL, json=_PAYLOAD, timeout=10)
+        return response.status_code
     except Exception as e:
         print(f"Telegram error: {e}")
-        return False
+        return 0
+
+
+def _log_failure(status: int, message: str):
+    """الإرسال يتم في الخلفية — الفشل لا يظهر عند المستدعي، لذلك نسجله هنا."""
+    preview = message[:80].replace("\n", " ")
+    print(f"❌ Telegram send failed (HTTP {status or 'error'}): {preview}")
 
 
 def _now() -> str:
     return datetime.now(TZ).strftime("%Y-%m-%d %H:%M %Z")
 
 
+# سطر السهم في قائمة أعلى 10 — قالب واحد لرسالتي Pre-Market وتحديث القائمة
+_MOVER_LINE = "  {sym:<6} | Δ={change_pct:.1%} | Range={intraday_range:.1%} | Vol={vol_spike:.1f}x"
+
+
+def _top_movers_lines(stocks: dict, n: int = 10) -> str:
+    """أعلى n أسهم حسب volatility_score — nlargest بدلاً من فرز القائمة كاملة."""
+    top = heapq.nlargest(n, stocks.items(), key=lambda x: x[1].get("volatility_score", 0))
+    return "\n".join(_MOVER_LINE.format_map(dict(info, sym=sym)) for sym, info in top)
+
+
 def notify_pre_market(stocks: dict) -> bool:
     """
     stocks: dict من get_daily_universe — {symbol: {change_pct, intraday_range, vol_spike, ...}}
@@ -36,17 +158,7 @@ def notify_pre_market(stocks: dict) -> bool:
     symbols = list(stocks.keys())
     total   = len(symbols)
 
-    # أعلى 10 حركةً
-    top10 = sorted(
-        stocks.items(),
-        key=lambda x: x[1].get("volatility_score", 0),
-        reverse=True
-    )[:10]
-
-    top10_lines = "\n".join(
-        f"  {sym:<6} | Δ={info['change_pct']:.1%} | Range={info['intraday_range']:.1%} | Vol={info['vol_spike']:.1f}x"
-        for sym, info in top10
-    )
+    top10_lines = _top_movers_lines(stocks)
 
     msg = (
         "🌅 <b>Pre-Market Watchlist</b>\n"
@@ -66,16 +178,7 @@ def notify_universe_refresh(stocks: dict) -> bool:
     symbols = list(stocks.keys())
     total   = len(symbols)
 
-    top10 = sorted(
-        stocks.items(),
-        key=lambda x: x[1].get("volatility_score", 0),
-        reverse=True
-    )[:10]
-
-    top10_lines = "\n".join(
-        f"  {sym:<6} | Δ={info['change_pct']:.1%} | Range={info['intraday_range']:.1%} | Vol={info['vol_spike']:.1f}x"
-        for sym, info in top10
-    )
+    top10_lines = _top_movers_lines(stocks)
 
     msg = (
         "🔄 <b>Hourly Watchlist Update</b>\n"
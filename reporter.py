@@ -6,12 +6,12 @@
 import os
 from datetime import datetime, date, timedelta
 from dataclasses import dataclass, asdict
-import pytz
+from zoneinfo import ZoneInfo
 
 from config import TIMEZONE
 from notifier import notify_daily_report
 
-TZ = pytz.timezone(TIMEZONE)
+TZ = ZoneInfo(TIMEZONE)
 
 
 # -----------------------------------------
@@ -71,8 +71,8 @@ def get_all_trade_dates() -> list[str]:
         ws = _get_closed_trades_ws()
         if not ws:
             return []
-        rows = ws.get_all_records()
-        dates = list({str(r.get("date", "")) for r in rows if r.get("date")})
+        # عمود التاريخ فقط — بدل تحميل كل صفوف Closed Trades
+        dates = {d for d in ws.col_values(1)[1:] if d}   # صف 1 = headers
         return sorted(dates, reverse=True)
     except Exception as e:
         print(f"⚠️  فشل جلب التواريخ: {e}")
@@ -146,25 +146,48 @@ def calculate_daily_stats(trades: list[dict]) -> dict:
             "long_trades": 0,  "short_trades": 0,
         }
 
-    wins       = [t for t in trades if t["outcome"] == "win"]
-    losses     = [t for t in trades if t["outcome"] == "loss"]
-    breakevens = [t for t in trades if t["outcome"] == "breakeven"]
-    pnls       = [t["pnl"] for t in trades]
+    # ── تمريرة واحدة على الصفقات بدلاً من 8 list comprehensions
+    wins = losses = breakevens = longs = shorts = 0
+    win_pnl = loss_pnl = total_pnl = total_r = 0.0
+    best = worst = trades[0]["pnl"]
+
+    for t in trades:
+        pnl     = t["pnl"]
+        outcome = t["outcome"]
+        total_pnl += pnl
+        total_r   += t["r_achieved"]
+        best  = max(best, pnl)
+        worst = min(worst, pnl)
+
+        if outcome == "win":
+            wins    += 1
+            win_pnl += pnl
+        elif outcome == "loss":
+            losses   += 1
+            loss_pnl += pnl
+        elif outcome == "breakeven":
+            breakevens += 1
+
+        side = t.get("side")
+        if side == "long":
+            longs += 1
+        elif side == "short":
+            shorts += 1
 
     return {
         "total_trades":  len(trades),
-        "wins":          len(wins),
-        "losses":        len(losses),
-        "breakevens":    len(breakevens),
-        "win_rate":      round(len(wins) / len(trades) * 100, 1),
-        "total_pnl":     round(sum(pnls), 2),
-        "total_r":       round(sum(t["r_achieved"] for t in trades), 2),
-        "avg_win":       round(sum(t["pnl"] for t in wins)   / len(wins)   if wins   else 0, 2),
-        "avg_loss":      round(sum(t["pnl"] for t in losses) / len(losses) if losses else 0, 2),
-        "best_trade":    round(max(pnls), 2),
-        "worst_trade":   round(min(pnls), 2),
-        "long_trades":   len([t for t in trades if t.get("side") == "long"]),
-        "short_trades":  len([t for t in trades if t.get("side") == "short"]),
+        "wins":          wins,
+        "losses":        losses,
+        "breakevens":    breakevens,
+        "win_rate":      round(wins / len(trades) * 100, 1),
+        "total_pnl":     round(total_pnl, 2),
+        "total_r":       round(total_r, 2),
+        "avg_win":       round(win_pnl  / wins   if wins   else 0, 2),
+        "avg_loss":      round(loss_pnl / losses if losses else 0, 2),
+        "best_trade":    round(best, 2),
+        "worst_trade":   round(worst, 2),
+        "long_trades":   longs,
+        "short_trades":  shorts,
     }
 
 
@@ -50,10 +50,7 @@ def calculate_position_size(
 
     leverage      = STRATEGY2_LEVERAGE if use_leverage else 1.0
     target_risk   = balance * effective_risk   # المبلغ المستهدف للمخاطرة (بدون رافعة)
-    quantity      = int((target_risk * leverage) / risk_per_share)
-
-    if quantity <= 0:
-        quantity = 1
+    quantity      = max(1, int((target_risk * leverage) / risk_per_share))   # سهم واحد على الأقل
 
     # ── فحص buying_power: تأكد أن التكلفة لا تتجاوز ما هو متاح
     if buying_power > 0:
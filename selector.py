@@ -3,15 +3,14 @@
 # يفرض حدود MAX_LONG / MAX_SHORT / MAX_TOTAL
 # =============================================================
 
-import requests
 import pandas as pd
 import numpy as np
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 
 from config import (
-    ALPACA_API_KEY,
-    ALPACA_SECRET_KEY,
     ALPACA_DATA_URL,
     MAX_LONG,
     MAX_SHORT,
@@ -25,7 +24,10 @@ from strategy_meanrev import (
     analyze as meanrev_analyze,
     MeanRevSignal,
     calc_adx as calculate_adx,
+    true_range,
+    prime_daily_cache,
 )
+from market_data import SESSION, throttle_data_request, bars_to_df
 from strategy_momentum import (
     analyze as momentum_analyze,
     MomentumSignal,
@@ -36,10 +38,10 @@ from strategy_momentum import (
 # 2. عند apply_position_limits كطبقة حماية إضافية
 MIN_SCORE = 20
 
-HEADERS = {
-    "APCA-API-KEY-ID":     ALPACA_API_KEY,
-    "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY,
-}
+# ── عدد الأسهم التي تُحلَّل بالتوازي — التحليل ينتظر الشبكة معظم الوقت
+# حد Alpaca (200 طلب/دقيقة) يفرضه throttle_data_request في طبقة الجلب
+# لذلك الـ workers تغطي زمن الرحلة فقط دون خطر 429
+ANALYSIS_WORKERS = 8
 
 
 # ─────────────────────────────────────────
@@ -130,9 +132,9 @@ def fetch_daily_bars(ticker: str, days: int = 60) -> pd.DataFrame:
     start = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
 
     try:
-        response = requests.get(
+        throttle_data_request()
+        response = SESSION.get(
             f"{ALPACA_DATA_URL}/v2/stocks/{ticker}/bars",
-            headers=HEADERS,
             params={
                 "timeframe": "1Day",
                 "start":     start,
@@ -143,14 +145,7 @@ def fetch_daily_bars(ticker: str, days: int = 60) -> pd.DataFrame:
             timeout=15,
         )
         bars = response.json().get("bars", [])
-        if not bars:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(bars)
-        df = df.rename(columns={"o": "open", "h": "high",
-                                 "l": "low",  "c": "close", "v": "volume"})
-        df["time"] = pd.to_datetime(df["t"])
-        return df.sort_values("time").reset_index(drop=True)
+        return bars_to_df(bars)
 
     except Exception as e:
         print(f"❌ خطأ في جلب بيانات {ticker}: {e}")
@@ -162,23 +157,26 @@ def fetch_daily_bars(ticker: str, days: int = 60) -> pd.DataFrame:
 # ─────────────────────────────────────────
 
 
-def calculate_atr_pct(df: pd.DataFrame, period: int = 14) -> float:
+def calculate_atr_pct(df: pd.DataFrame, period: int = 14, tr: np.ndarray | None = None) -> float:
     """يحسب ATR كنسبة مئوية من السعر الحالي."""
     if len(df) < period + 1:
         return 0.0
 
-    prev_close = df["close"].shift(1)
-    tr = pd.concat([
-        df["high"] - df["low"],
-        (df["high"] - prev_close).abs(),
-        (df["low"]  - prev_close).abs(),
-    ], axis=1).max(axis=1)
+    if tr is None:
+        tr = true_range(df)
 
-    atr        = tr.rolling(period).mean().iloc[-1]
+    # آخر قيمة لـ rolling(period).mean() = متوسط آخر period شمعة
+    atr        = tr[-period:].mean()
     last_close = df["close"].iloc[-1]
     return round(float(atr / last_close) if last_close > 0 else 0.0, 4)
 
 
+def calculate_trend_volatility(df: pd.DataFrame, period: int = 14) -> tuple[float, float]:
+    """ADX و ATR% معاً — True Range يُحسب مرة واحدة ويتشاركه المؤشران."""
+    tr = true_range(df)
+    return calculate_adx(df, period, tr=tr), calculate_atr_pct(df, period, tr=tr)
+
+
 # ─────────────────────────────────────────
 # 3. تطبيق حدود المراكز
 # ─────────────────────────────────────────
@@ -194,34 +192,36 @@ def apply_position_limits(
     الإجمالي : MAX_TOTAL=5
     """
     # المراكز المفتوحة حالياً حسب الاستراتيجية
-    open_rev_long   = sum(1 for t in current_positions.values() if t == ("long",  "meanrev"))
-    open_rev_short  = sum(1 for t in current_positions.values() if t == ("short", "meanrev"))
-    open_mom_long   = sum(1 for t in current_positions.values() if t == ("long",  "momentum"))
-    open_mom_short  = sum(1 for t in current_positions.values() if t == ("short", "momentum"))
+    # تمريرة واحدة بـ Counter بدلاً من أربع تمريرات sum()
+    open_counts     = Counter(current_positions.values())
+    open_rev_long   = open_counts[("long",  "meanrev")]
+    open_rev_short  = open_counts[("short", "meanrev")]
+    open_mom_long   = open_counts[("long",  "momentum")]
+    open_mom_short  = open_counts[("short", "momentum")]
     open_total      = len(current_positions)
 
     # استبعاد الأسهم المفتوحة مسبقاً
     signals = [s for s in signals if s.ticker not in current_positions]
 
+    # ── حساب الـ Score مرة واحدة لكل إشارة وتخزينه للاستخدام في Dynamic Risk
+    for s in signals:
+        s.score = score_signal(s)
+
     # ── رفض الإشارات ضعيفة الجودة
     # الحد الأدنى 20 متوافق مع Dynamic Risk:
     # Score < 20 → مخاطرة 2% فقط، ومعظمها إشارات ضعيفة لا تستحق الدخول
-    rejected_weak = [s for s in signals if score_signal(s) < MIN_SCORE]
-    signals       = [s for s in signals if score_signal(s) >= MIN_SCORE]
+    rejected_weak = [s for s in signals if s.score < MIN_SCORE]
+    signals       = [s for s in signals if s.score >= MIN_SCORE]
     if rejected_weak:
         print(f"  ⛔ رُفض {len(rejected_weak)} إشارة Score < {MIN_SCORE}: {[s.ticker for s in rejected_weak]}")
 
     # ── ترتيب بالـ Score (الأعلى أولاً)
-    signals.sort(key=lambda x: score_signal(x), reverse=True)
-
-    # ── تخزين الـ Score في كل إشارة للاستخدام في Dynamic Risk
-    for s in signals:
-        s.score = score_signal(s)
+    signals.sort(key=lambda x: x.score, reverse=True)
 
     # طباعة الترتيب
     print("\n📊 Signal Ranking:")
     for i, s in enumerate(signals[:10], 1):
-        sc = score_signal(s)
+        sc = s.score
         tf = f"[{s.timeframe}]"   # استخدام الحقل المباشر بدلاً من تحليل sig.reason
         print(f"   #{i} {s.ticker:6s} {s.side.upper():5s} | Score={sc:.0f} | RSI={s.rsi:.1f} | {tf} | {'⭐' if s.signal_quality=='high' else ''} {'🎯' if s.liquidity_sweep else ''}")
 
@@ -264,6 +264,43 @@ def apply_position_limits(
 # 4. الدالة الرئيسية
 # ─────────────────────────────────────────
 
+def _analyze_ticker(ticker: str, ema_above: bool, exchange: str, ema200: float, df_1day=None) -> tuple:
+    """
+    يشغّل الاستراتيجيتين على سهم واحد — يُستدعى من thread pool.
+    df_1day: الشموع اليومية من prime_daily_cache — تُمرَّر للاستراتيجيتين بدل إعادة جلبها.
+    """
+    rev_signal = meanrev_analyze(
+        ticker=ticker,
+        ema_above=ema_above,
+        exchange=exchange,
+        ema200=ema200,
+        df_1day=df_1day,
+    )
+    mom_raw = momentum_analyze(
+        ticker=ticker,
+        exchange=exchange,
+        ema200=ema200,
+        df_1day=df_1day,
+    )
+    return rev_signal, mom_raw
+
+
+def _no_slots_left(current_positions: dict) -> bool:
+    """
+    True إذا لم يبقَ مكان لأي إشارة — الإجمالي ممتلئ أو كل حصص الاستراتيجيتين ممتلئة.
+    نفس حدود apply_position_limits، لكن قبل الجلب والتحليل.
+    """
+    if len(current_positions) >= MAX_TOTAL:
+        return True
+    open_counts = Counter(current_positions.values())
+    return (
+        open_counts[("long",  "meanrev")]  >= MAX_MEANREV_LONG
+        and open_counts[("short", "meanrev")]  >= MAX_MEANREV_SHORT
+        and open_counts[("long",  "momentum")] >= MAX_MOMENTUM_LONG
+        and open_counts[("short", "momentum")] >= MAX_MOMENTUM_SHORT
+    )
+
+
 def run_selector(
     tickers:           dict,
     current_positions: dict = None,
@@ -283,47 +320,75 @@ def run_selector(
     if current_positions is None:
         current_positions = {}
 
+    # ── لا مكان لأي صفقة جديدة → أي إشارة ستُرفض في apply_position_limits
+    # نتخطى جلب الشموع والتحليل بالكامل بدلاً من دفع طلبات HTTP بلا فائدة
+    if _no_slots_left(current_positions):
+        print(f"\n⏸️  كل الحصص ممتلئة ({len(current_positions)}/{MAX_TOTAL}) — تخطي التحليل")
+        return {"meanrev": [], "summary": []}
+
     print("\n📊 جاري تحليل الأسهم باستراتيجية الارتداد...")
     print("─" * 55)
 
     all_signals = []
     summary     = []
 
-    for ticker, info in tickers.items():
-        ema_above = info.get("ema_above", False) if isinstance(info, dict) else bool(info)
-        exchange  = info.get("exchange", "NASDAQ") if isinstance(info, dict) else "NASDAQ"
-        ema200    = info.get("ema200", 0.0) if isinstance(info, dict) else 0.0
-
-        df = fetch_daily_bars(ticker)
-
-        if df.empty or len(df) < 15:
+    # ── الأسهم ذات المراكز المفتوحة تُستبعد لاحقاً في apply_position_limits
+    # لذلك لا نجلب شموعها ولا نحللها أصلاً
+    held = [t for t in tickers if t in current_positions]
+    if held:
+        print(f"  ⏭️  تخطي {len(held)} سهم بمراكز مفتوحة: {held}")
+        tickers = {t: info for t, info in tickers.items() if t not in current_positions}
+
+    # ── الشموع اليومية لكل الأسهم دفعة واحدة بدلاً من طلب لكل سهم
+    # تُمرَّر كاملة للاستراتيجيتين → analyze() لا يطلب 1Day منفصلاً حتى لو طال المسح
+    # مؤشرات التصنيف تُحسب على آخر 60 يوماً كما في fetch_daily_bars
+    primed    = prime_daily_cache(list(tickers))
+    cutoff    = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=60)
+    daily_map = {t: df[df["time"] >= cutoff].reset_index(drop=True)
+                 for t, df in primed.items()}
+
+    # ── تشغيل الاستراتيجيتين على كل الأسهم بالتوازي (I/O-bound)
+    # الطباعة تبقى بالترتيب الأصلي في الحلقة التالية
+    jobs = {}
+    with ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS) as pool:
+        for ticker, info in tickers.items():
+            ema_above = info.get("ema_above", False) if isinstance(info, dict) else bool(info)
+            exchange  = info.get("exchange", "NASDAQ") if isinstance(info, dict) else "NASDAQ"
+            ema200    = info.get("ema200", 0.0) if isinstance(info, dict) else 0.0
+
+            df = daily_map[ticker] if ticker in daily_map else fetch_daily_bars(ticker)
+
+            if df.empty or len(df) < 15:
+                jobs[ticker] = None
+                continue
+
+            jobs[ticker] = (df, ema200, pool.submit(
+                _analyze_ticker, ticker, ema_above, exchange, ema200, primed.get(ticker),
+            ))
+
+    for ticker, job in jobs.items():
+        if job is None:
             print(f"  {ticker:6s} | ⚠️  بيانات غير كافية")
             continue
 
-        adx     = calculate_adx(df)
-        atr_pct = calculate_atr_pct(df)
+        df, ema200, future = job
+        try:
+            rev_signal, mom_raw = future.result()
+        except Exception as e:
+            print(f"  {ticker:6s} | ❌ خطأ في التحليل: {e}")
+            continue
+
+        adx, atr_pct = calculate_trend_volatility(df)
 
         print(f"  {ticker:6s} | ADX={adx:5.1f} | ATR={atr_pct:.1%}", end="")
 
-        # ── تشغيل الاستراتيجيتين على كل سهم
         candidates = []
 
         # 1. MeanRev
-        rev_signal = meanrev_analyze(
-            ticker=ticker,
-            ema_above=ema_above,
-            exchange=exchange,
-            ema200=ema200,
-        )
         if rev_signal.has_signal:
             candidates.append(rev_signal)
 
         # 2. Momentum — نحوّله لـ MeanRevSignal للتوحيد
-        mom_raw = momentum_analyze(
-            ticker=ticker,
-            exchange=exchange,
-            ema200=ema200,
-        )
         if mom_raw.has_signal:
             mom_unified = MeanRevSignal(
                 ticker=mom_raw.ticker,
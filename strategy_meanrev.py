@@ -3,7 +3,7 @@
 # الإصدار: 2.0 (تحسين جودة الـ SHORT و Liquidity Sweep)
 # =============================================================
 
-import requests
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -11,9 +11,6 @@ from dataclasses import dataclass
 from typing import Optional
 
 from config import (
-    ALPACA_API_KEY,
-    ALPACA_SECRET_KEY,
-    ALPACA_DATA_URL,
     S2_RSI_PERIOD,
     S2_RSI_OVERSOLD,
     S2_RSI_HIGH_QUALITY,
@@ -29,11 +26,7 @@ from config import (
     SHORT_EXCHANGES,
     HISTORY_BARS,
 )
-
-HEADERS = {
-    "APCA-API-KEY-ID":      ALPACA_API_KEY,
-    "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY,
-}
+from market_data import request_bars, request_bars_batch
 
 # ─── فلتر News Trap ───────────────────────
 # ATR على 1Day أكثر من 8% = حدث استثنائي → رفض
@@ -47,6 +40,20 @@ def _check_news(ticker: str) -> bool:
     except Exception:
         return False
 
+# ─── Daily Bars Cache — الشموع اليومية التاريخية لا تتغير خلال اليوم
+# في كل مسح (كل 5 دقائق) كنا نعيد جلب 260 شمعة لكل سهم — الآن نجلب الذيل فقط
+_daily_cache: dict    = {}   # (ticker, days) → DataFrame
+_daily_cache_at: dict = {}   # (ticker, days) → time.monotonic() لآخر تحديث
+_daily_cache_day      = ""   # تاريخ UTC للـ cache الحالي
+
+# الـ cache المُحدَّث دفعة واحدة عبر prime_daily_cache يُستخدم مباشرة دون طلب جديد
+DAILY_CACHE_FRESH_SEC = 120
+
+# ─── 15Min Cache قصير — MeanRev و Momentum يطلبان شموع 15 دقيقة لنفس السهم في نفس المسح
+# نخزّن الطلب لدقيقة واحدة فقط حتى تبقى الشمعة الجارية حديثة في المسح التالي
+_intraday_cache: dict = {}   # ticker → (time.monotonic(), DataFrame)
+INTRADAY_CACHE_TTL    = 60
+
 # ─────────────────────────────────────────
 # نموذج إشارة التداول
 # ─────────────────────────────────────────
@@ -78,13 +85,20 @@ class MeanRevSignal:
 # 1. جلب البيانات وحساب المؤشرات
 # ─────────────────────────────────────────
 
-def fetch_bars(ticker: str, timeframe: str = "1Day", days: int = HISTORY_BARS) -> pd.DataFrame:
+def fetch_bars(
+    ticker:        str,
+    timeframe:     str = "1Day",
+    days:          int = HISTORY_BARS,
+    lookback_days: Optional[int] = None,
+    limit:         Optional[int] = None,
+) -> pd.DataFrame:
     """
     يجلب الشموع بأي تايم فريم.
     timeframe: '1Day' | '1Hour' | '15Min'
+    lookback_days / limit: لتجاوز النافذة الافتراضية للتايم فريم
     """
     # عدد الأيام المطلوبة حسب التايم فريم
-    lookback = {
+    lookback = lookback_days or {
         "1Day":  days + 30,
         "1Hour": 10,       # آخر 10 أيام تكفي للـ 1H
         "15Min": 5,        # آخر 5 أيام تكفي للـ 15Min
@@ -94,50 +108,125 @@ def fetch_bars(ticker: str, timeframe: str = "1Day", days: int = HISTORY_BARS) -
     start = (datetime.utcnow() - timedelta(days=lookback)).strftime("%Y-%m-%dT%H:%M:%SZ")
 
     # عدد الشموع المطلوبة
-    bar_limit = {
+    bar_limit = limit or {
         "1Day":  days,
         "1Hour": 120,   # آخر 120 شمعة ساعية
         "15Min": 200,   # آخر 200 شمعة 15 دقيقة
     }.get(timeframe, days)
 
-    try:
-        response = requests.get(
-            f"{ALPACA_DATA_URL}/v2/stocks/{ticker}/bars",
-            headers=HEADERS,
-            params={
-                "timeframe": timeframe,
-                "start":     start,
-                "end":       end,
-                "limit":     bar_limit,
-                "feed":      "iex",
-            },
-            timeout=15,
-        )
-        bars = response.json().get("bars", [])
-        if not bars: return pd.DataFrame()
-
-        df = pd.DataFrame(bars)
-        df = df.rename(columns={"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"})
-        df["time"] = pd.to_datetime(df["t"])
-        return df.sort_values("time").reset_index(drop=True)
-    except Exception as e:
-        print(f"❌ خطأ في جلب بيانات {ticker} [{timeframe}]: {e}")
-        return pd.DataFrame()
+    # ── 1Day: تحديث تزايدي — نجلب فقط من آخر شمعة محفوظة (تشمل شمعة اليوم الجارية)
+    use_cache = timeframe == "1Day" and lookback_days is None and limit is None
+    cached    = None
+    if use_cache:
+        _roll_daily_cache()
+        cached = _daily_cache.get((ticker, days))
+        if cached is not None:
+            if time.monotonic() - _daily_cache_at.get((ticker, days), 0) < DAILY_CACHE_FRESH_SEC:
+                return cached
+            start = cached["t"].iloc[-1]
+
+    df = request_bars(ticker, timeframe, start, end, bar_limit)
+
+    if use_cache and not df.empty:
+        if cached is not None:
+            df = _merge_daily(cached, df, days)
+        _daily_cache[(ticker, days)]    = df
+        _daily_cache_at[(ticker, days)] = time.monotonic()
+    return df
+
+
+def prime_daily_cache(tickers: list, days: int = HISTORY_BARS) -> dict:
+    """
+    يحدّث cache الشموع اليومية لكل الأسهم بطلبات multi-symbol بدلاً من طلب لكل سهم.
+    الأسهم غير المخزنة → تاريخ كامل | المخزنة → من أقدم آخر شمعة بينها فقط.
+    بعدها fetch_bars(ticker) داخل analyze() يقرأ من الـ cache دون طلب HTTP.
+
+    يُرجع {ticker: DataFrame} — السهم الغائب يعني فشل الجلب.
+    السهم المخزن الذي فشل تحديثه لا يُرجع ولا يُعلَّم حديثاً — نسخته القديمة قد تنقصها آخر الشموع.
+    """
+    _roll_daily_cache()
+    now   = datetime.utcnow()
+    end   = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+    cold  = [t for t in tickers if (t, days) not in _daily_cache]
+    warm  = [t for t in tickers if (t, days) in _daily_cache]
+
+    fetched = {}
+    if cold:
+        start = (now - timedelta(days=days + 30)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        fetched.update(request_bars_batch(cold, "1Day", start, end))
+    if warm:
+        start = min(_daily_cache[(t, days)]["t"].iloc[-1] for t in warm)
+        fetched.update(request_bars_batch(warm, "1Day", start, end))
+
+    # request_bars_batch يُسقط الدفعات غير المكتملة → كل ما في fetched جاء من دفعة نظيفة
+    refreshed_at = time.monotonic()
+    refreshed    = {}
+    for ticker, df in fetched.items():
+        if df.empty:
+            continue
+        cached = _daily_cache.get((ticker, days))
+        df = _merge_daily(cached, df, days) if cached is not None else df.tail(days).reset_index(drop=True)
+        _daily_cache[(ticker, days)]    = df
+        _daily_cache_at[(ticker, days)] = refreshed_at
+        refreshed[ticker]               = df
+
+    return refreshed
+
+
+def _merge_daily(cached: pd.DataFrame, new: pd.DataFrame, days: int) -> pd.DataFrame:
+    """يدمج الشموع الجديدة مع المخزنة — شمعة اليوم الجارية تُستبدل بأحدث نسخة."""
+    return (pd.concat([cached, new], ignore_index=True)
+              .drop_duplicates("t", keep="last")
+              .tail(days)
+              .reset_index(drop=True))
+
+
+def _roll_daily_cache():
+    """يفرّغ cache الشموع اليومية مع بداية يوم جديد — جلب كامل مرة واحدة يومياً."""
+    global _daily_cache_day
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    if today != _daily_cache_day:
+        _daily_cache.clear()
+        _daily_cache_at.clear()
+        _daily_cache_day = today
 
 def calc_rsi(closes: pd.Series, period: int = S2_RSI_PERIOD) -> float:
-    delta = closes.diff()
-    gain  = delta.clip(lower=0).rolling(period).mean()
-    loss  = (-delta.clip(upper=0)).rolling(period).mean()
-    rs    = gain / loss.replace(0, np.nan)
-    rsi   = 100 - (100 / (1 + rs))
-    val   = rsi.iloc[-1]
-    return round(float(val) if not pd.isna(val) else 50.0, 2)
+    # نحتاج آخر قيمة فقط — متوسط آخر period تغيّر = آخر قيمة لـ rolling(period).mean()
+    delta = np.diff(closes.to_numpy(dtype=np.float64))
+    if len(delta) < period:
+        return 50.0
+    window = delta[-period:]
+    gain   = np.maximum(window, 0.0).mean()
+    loss   = np.maximum(-window, 0.0).mean()
+    if not loss > 0:   # loss = 0 أو NaN → RS غير معرّف كما في replace(0, nan)
+        return 50.0
+    rsi = 100 - (100 / (1 + gain / loss))
+    return round(float(rsi) if not np.isnan(rsi) else 50.0, 2)
+
+def true_range(df: pd.DataFrame) -> np.ndarray:
+    """
+    True Range كمصفوفة float64 متصلة — بدون pd.concat ثلاثي.
+    الشمعة الأولى (لا يوجد إغلاق سابق) = high - low كما في pandas max(axis=1).
+    """
+    high  = df["high"].to_numpy(dtype=np.float64)
+    low   = df["low"].to_numpy(dtype=np.float64)
+    close = df["close"].to_numpy(dtype=np.float64)
+
+    prev_close     = np.empty_like(close)
+    prev_close[0]  = np.nan
+    prev_close[1:] = close[:-1]
+
+    # fmax تتجاهل NaN — نفس سلوك skipna في pandas
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
 
 def calc_atr(df: pd.DataFrame, period: int = 14) -> float:
-    prev_close = df["close"].shift(1)
-    tr = pd.concat([df["high"] - df["low"], (df["high"] - prev_close).abs(), (df["low"] - prev_close).abs()], axis=1).max(axis=1)
-    atr = tr.rolling(period).mean().iloc[-1]
-    return round(float(atr) if not pd.isna(atr) else 0.0, 4)
+    tr = true_range(df)
+    if len(tr) < period:
+        return 0.0
+    # آخر قيمة لـ rolling(period).mean() = متوسط آخر period شمعة — بدون سلسلة كاملة
+    atr = tr[-period:].mean()
+    return round(float(atr) if not np.isnan(atr) else 0.0, 4)
 
 
 def calc_vwap(df: pd.DataFrame) -> float:
@@ -145,17 +234,21 @@ def calc_vwap(df: pd.DataFrame) -> float:
     vwap    = (typical * df["volume"]).sum() / df["volume"].sum()
     return round(float(vwap) if not pd.isna(vwap) else 0.0, 4)
 
-def calc_adx(df: pd.DataFrame, period: int = 14) -> float:
-    """يحسب ADX — قوة الاتجاه. < 25 = سوق عرضي مناسب لـ MeanRev."""
+def calc_adx(df: pd.DataFrame, period: int = 14, tr: Optional[np.ndarray] = None) -> float:
+    """
+    يحسب ADX — قوة الاتجاه. < 25 = سوق عرضي مناسب لـ MeanRev.
+    tr: True Range محسوب مسبقاً (من true_range) لمشاركته مع ATR بدلاً من حسابه مرتين.
+    """
     if len(df) < period * 2 + 1:
         return 0.0
-    high, low, close = df["high"], df["low"], df["close"]
-    prev_close = close.shift(1)
-    tr = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
-    up_move   = high.diff()
-    down_move = -low.diff()
-    plus_dm  = pd.Series(np.where((up_move > down_move) & (up_move > 0), up_move, 0.0), index=df.index)
-    minus_dm = pd.Series(np.where((down_move > up_move) & (down_move > 0), down_move, 0.0), index=df.index)
+    # TR و DM على ndarray مباشرة — Series فقط لتنعيم Wilder (ewm)
+    high = df["high"].to_numpy(dtype=np.float64)
+    low  = df["low"].to_numpy(dtype=np.float64)
+    tr   = pd.Series(true_range(df) if tr is None else tr)
+    up_move   = np.diff(high, prepend=high[0])    # الشمعة الأولى = 0 (لا حركة سابقة)
+    down_move = -np.diff(low, prepend=low[0])
+    plus_dm  = pd.Series(np.where((up_move > down_move) & (up_move > 0), up_move, 0.0))
+    minus_dm = pd.Series(np.where((down_move > up_move) & (down_move > 0), down_move, 0.0))
     atr_s    = tr.ewm(alpha=1/period, adjust=False).mean()
     plus_di  = 100 * (plus_dm.ewm(alpha=1/period, adjust=False).mean()  / atr_s.replace(0, np.nan))
     minus_di = 100 * (minus_dm.ewm(alpha=1/period, adjust=False).mean() / atr_s.replace(0, np.nan))
@@ -174,16 +267,9 @@ def check_volatility_expansion(df: pd.DataFrame, period: int = 20) -> tuple[bool
     if len(df) < period + 2:
         return True, 1.0  # نسمح بالمرور إذا البيانات غير كافية
 
-    prev_close = df["close"].shift(1)
-    tr = pd.concat([
-        df["high"] - df["low"],
-        (df["high"] - prev_close).abs(),
-        (df["low"]  - prev_close).abs(),
-    ], axis=1).max(axis=1)
-
-    atr_series  = tr.rolling(14).mean()
-    atr_current = float(atr_series.iloc[-1])
-    atr_avg     = float(atr_series.iloc[-period:-1].mean())
+    atr_series  = pd.Series(true_range(df)).rolling(14).mean().to_numpy()
+    atr_current = float(atr_series[-1])
+    atr_avg     = float(np.nanmean(atr_series[-period:-1]))
 
     if atr_avg <= 0:
         return True, 1.0
@@ -193,6 +279,25 @@ def check_volatility_expansion(df: pd.DataFrame, period: int = 20) -> tuple[bool
     return ratio >= 0.8, ratio
 
 
+@dataclass
+class Indicators:
+    """مؤشرات إطار زمني واحد — تُحسب مرة واحدة ويتشاركها LONG و SHORT."""
+    rsi:           float
+    atr:           float
+    vwap:          float
+    adx:           float
+    vol_expanding: bool
+    vol_ratio:     float
+
+
+def calc_indicators(df: pd.DataFrame) -> Indicators:
+    vol_expanding, vol_ratio = check_volatility_expansion(df)
+    return Indicators(
+        rsi=calc_rsi(df["close"]), atr=calc_atr(df), vwap=calc_vwap(df), adx=calc_adx(df),
+        vol_expanding=vol_expanding, vol_ratio=vol_ratio,
+    )
+
+
 def check_liquidity_heatmap_long(df: pd.DataFrame, lookback: int = 20) -> bool:
     """
     التعديل 3: Liquidity Heatmap — Stop Hunt تحت Low 20
@@ -202,13 +307,18 @@ def check_liquidity_heatmap_long(df: pd.DataFrame, lookback: int = 20) -> bool:
     if not LIQUIDITY_SWEEP_ENABLED or len(df) < lookback + 2:
         return False
 
-    curr_low   = df["low"].iloc[-1]
-    curr_close = df["close"].iloc[-1]
-    curr_vol   = df["volume"].iloc[-1]
+    # نستخرج المصفوفات مرة واحدة — الفهرسة على ndarray أسرع من iloc
+    lows   = df["low"].to_numpy(dtype=np.float64)
+    closes = df["close"].to_numpy(dtype=np.float64)
+    vols   = df["volume"].to_numpy(dtype=np.float64)
+
+    curr_low   = lows[-1]
+    curr_close = closes[-1]
+    curr_vol   = vols[-1]
 
     # أدنى قاع خلال آخر 20 شمعة (ما عدا الأخيرة)
-    low_20     = df["low"].iloc[-lookback-1:-1].min()
-    avg_vol    = df["volume"].iloc[-lookback-1:-1].mean()
+    low_20     = lows[-lookback-1:-1].min()
+    avg_vol    = vols[-lookback-1:-1].mean()
 
     # الشرط: كسر القاع + إغلاق فوقه + حجم مرتفع
     swept      = curr_low < low_20 and curr_close > low_20
@@ -226,13 +336,17 @@ def check_liquidity_heatmap_short(df: pd.DataFrame, lookback: int = 20) -> bool:
     if not LIQUIDITY_SWEEP_ENABLED or len(df) < lookback + 2:
         return False
 
-    curr_high  = df["high"].iloc[-1]
-    curr_close = df["close"].iloc[-1]
-    curr_vol   = df["volume"].iloc[-1]
+    highs  = df["high"].to_numpy(dtype=np.float64)
+    closes = df["close"].to_numpy(dtype=np.float64)
+    vols   = df["volume"].to_numpy(dtype=np.float64)
+
+    curr_high  = highs[-1]
+    curr_close = closes[-1]
+    curr_vol   = vols[-1]
 
     # أعلى قمة خلال آخر 20 شمعة (ما عدا الأخيرة)
-    high_20    = df["high"].iloc[-lookback-1:-1].max()
-    avg_vol    = df["volume"].iloc[-lookback-1:-1].mean()
+    high_20    = highs[-lookback-1:-1].max()
+    avg_vol    = vols[-lookback-1:-1].mean()
 
     swept      = curr_high > high_20 and curr_close < high_20
     vol_confirm = curr_vol > avg_vol * 1.3
@@ -274,6 +388,52 @@ def update_trailing_stop(current_price: float, current_stop: float, trail_step:
     new_stop = current_price - trail_step
     return round(max(new_stop, current_stop), 4)
 
+def fetch_15min_bars_shared(ticker: str) -> pd.DataFrame:
+    """
+    شموع 15Min لآخر 10 أيام — طلب واحد لكل سهم في المسح يتشاركه MeanRev و Momentum.
+    النسخة المخزنة صالحة لـ INTRADAY_CACHE_TTL ثانية فقط.
+    """
+    now    = time.monotonic()
+    cached = _intraday_cache.get(ticker)
+    if cached is not None and now - cached[0] < INTRADAY_CACHE_TTL:
+        return cached[1]
+
+    df = fetch_bars(ticker, timeframe="15Min", lookback_days=10, limit=2000)
+
+    # تنظيف الأسهم التي خرجت من الـ universe — لا يكبر الـ cache بلا حد
+    # list(...) لقطة واحدة — threads التحليل الأخرى قد تكتب في الـ dict بالتوازي
+    for key in [k for k, (at, _) in list(_intraday_cache.items()) if now - at >= INTRADAY_CACHE_TTL]:
+        _intraday_cache.pop(key, None)
+    if not df.empty:
+        _intraday_cache[ticker] = (now, df)
+    return df
+
+
+def fetch_intraday_frames(ticker: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    طلب واحد لشموع 15Min (آخر 10 أيام) ثم اشتقاق 1Hour منها بـ resample
+    بدلاً من طلبين منفصلين لنفس الفترة.
+    يُرجع (df_1hour, df_15min) بنفس نوافذ fetch_bars: 120 شمعة ساعية / 200 شمعة 15 دقيقة خلال 5 أيام.
+    """
+    df = fetch_15min_bars_shared(ticker)
+    if df.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    # شموع الساعة — نفس محاذاة Alpaca (الشمعة تبدأ على رأس الساعة)
+    df_1hour = (
+        df.set_index("time")
+          .resample("1h")
+          .agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+          .dropna(subset=["close"])
+          .tail(120)
+          .reset_index()
+    )
+
+    since    = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=5)
+    df_15min = df[df["time"] >= since].tail(200).reset_index(drop=True)
+    return df_1hour, df_15min
+
+
 def refresh_allowed_tickers(candidate_tickers: list):
     print(f"🔄 تحديث قائمة الأسهم المسموح بها: {len(candidate_tickers)} سهم")
 
@@ -294,15 +454,14 @@ def check_liquidity_sweep_short(df: pd.DataFrame) -> bool:
 # 3. التحليل الرئيسي - LONG
 # ─────────────────────────────────────────
 
-def _analyze_long(ticker: str, df: pd.DataFrame, ema_above: bool, ema200: float, timeframe: str = "1Day") -> MeanRevSignal:
+def _analyze_long(ticker: str, df: pd.DataFrame, ema_above: bool, ema200: float, timeframe: str = "1Day",
+                  ind: Optional[Indicators] = None) -> MeanRevSignal:
+    ind      = ind or calc_indicators(df)
     price    = df["close"].iloc[-1]
-    rsi      = calc_rsi(df["close"])
-    atr      = calc_atr(df)
-    vwap     = calc_vwap(df)
-    adx      = calc_adx(df)
+    rsi, atr, vwap, adx = ind.rsi, ind.atr, ind.vwap, ind.adx
     atr_pct  = atr / price if price > 0 else 0
     vwap_dev = (price - vwap) / vwap if vwap > 0 else 0
-    vol_expanding, vol_ratio = check_volatility_expansion(df)
+    vol_expanding, vol_ratio = ind.vol_expanding, ind.vol_ratio
 
     tf_tag = f"[{timeframe}]"
 
@@ -364,18 +523,24 @@ def _analyze_long(ticker: str, df: pd.DataFrame, ema_above: bool, ema200: float,
 
 S2_RSI_HIGH_QUALITY_SHORT = 80
 
-def _analyze_short(ticker: str, df: pd.DataFrame, exchange: str, ema200: float, timeframe: str = "1Day") -> MeanRevSignal:
-    price      = df["close"].iloc[-1]
-    prev_close = df["close"].iloc[-2]
-    open_price = df["open"].iloc[-1]
-    high_price = df["high"].iloc[-1]
-
-    rsi      = calc_rsi(df["close"])
-    atr      = calc_atr(df)
-    vwap     = calc_vwap(df)
-    adx      = calc_adx(df)
+def _analyze_short(ticker: str, df: pd.DataFrame, exchange: str, ema200: float, timeframe: str = "1Day",
+                   ind: Optional[Indicators] = None) -> MeanRevSignal:
+    # ── الفحوص الرخيصة أولاً — لا داعي لحساب المؤشرات إذا SHORT مرفوض مسبقاً
+    if not SHORT_ENABLED or exchange not in SHORT_EXCHANGES:
+        return MeanRevSignal(ticker=ticker, side="short", has_signal=False,
+                             reason="SHORT غير مفعّل" if not SHORT_ENABLED else "بورصة غير مدعومة",
+                             ema200=ema200, timeframe=timeframe)
+
+    close      = df["close"].to_numpy()
+    price      = close[-1]
+    prev_close = close[-2]
+    open_price = df["open"].to_numpy()[-1]
+    high_price = df["high"].to_numpy()[-1]
+
+    ind      = ind or calc_indicators(df)
+    rsi, atr, vwap, adx = ind.rsi, ind.atr, ind.vwap, ind.adx
     atr_pct  = atr / price if price > 0 else 0
-    vol_expanding, vol_ratio = check_volatility_expansion(df)
+    vol_expanding, vol_ratio = ind.vol_expanding, ind.vol_ratio
     tf_tag   = f"[{timeframe}]"
 
     def no_signal(reason: str):
@@ -383,10 +548,6 @@ def _analyze_short(ticker: str, df: pd.DataFrame, exchange: str, ema200: float,
                              rsi=rsi, atr=atr, atr_pct=atr_pct, vwap=vwap, adx=adx, ema200=ema200,
                              timeframe=timeframe)
 
-    if not SHORT_ENABLED:
-        return no_signal("SHORT غير مفعّل")
-    if exchange not in SHORT_EXCHANGES:
-        return no_signal("بورصة غير مدعومة")
     if not (S2_ATR_MIN_PCT <= atr_pct <= S2_ATR_MAX_PCT):
         return no_signal(f"ATR غير مناسب: {atr_pct:.1%}")
     if rsi <= S2_RSI_OVERBOUGHT:
@@ -427,14 +588,22 @@ def _analyze_short(ticker: str, df: pd.DataFrame, exchange: str, ema200: float,
 # 5. الدالة الرئيسية — Multi-Timeframe
 # ─────────────────────────────────────────
 
-def analyze(ticker: str, ema_above: bool = True, exchange: str = "NASDAQ", ema200: float = 0.0) -> MeanRevSignal:
+def analyze(
+    ticker:    str,
+    ema_above: bool  = True,
+    exchange:  str   = "NASDAQ",
+    ema200:    float = 0.0,
+    df_1day:   Optional[pd.DataFrame] = None,
+) -> MeanRevSignal:
     """
     يحلل السهم على 3 تايم فريمات بالترتيب:
     1Day → 1Hour → 15Min
     يتحقق من News Trap أولاً قبل أي تحليل.
+    df_1day: الشموع اليومية إن جلبها المستدعي مسبقاً (selector) — لا طلب إضافي.
     """
     # ── فلتر News Trap — يجلب 1Day مرة واحدة للفحص
-    df_1day = fetch_bars(ticker, timeframe="1Day")
+    if df_1day is None:
+        df_1day = fetch_bars(ticker, timeframe="1Day")
 
     if not df_1day.empty:
         is_trap, trap_reason = check_news_trap(ticker, df_1day)
@@ -450,18 +619,28 @@ def analyze(ticker: str, ema_above: bool = True, exchange: str = "NASDAQ", ema20
         ("15Min", 30),
     ]
 
+    intraday = None   # (df_1hour, df_15min) — يُجلب مرة واحدة عند الحاجة فقط
+
     for tf, min_bars in timeframes:
         # 1Day جُلب مسبقاً — نعيد استخدامه
-        df = df_1day if tf == "1Day" else fetch_bars(ticker, timeframe=tf)
+        if tf == "1Day":
+            df = df_1day
+        else:
+            if intraday is None:
+                intraday = fetch_intraday_frames(ticker)
+            df = intraday[0] if tf == "1Hour" else intraday[1]
 
         if df.empty or len(df) < min_bars:
             continue
 
-        long_signal = _analyze_long(ticker, df, ema_above, ema200, timeframe=tf)
+        # المؤشرات نفسها للاتجاهين — تُحسب مرة واحدة لكل إطار
+        ind = calc_indicators(df)
+
+        long_signal = _analyze_long(ticker, df, ema_above, ema200, timeframe=tf, ind=ind)
         if long_signal.has_signal:
             return long_signal
 
-        short_signal = _analyze_short(ticker, df, exchange, ema200, timeframe=tf)
+        short_signal = _analyze_short(ticker, df, exchange, ema200, timeframe=tf, ind=ind)
         if short_signal.has_signal:
             return short_signal
 
@@ -5,15 +5,13 @@
 # =============================================================
 
 import requests
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 
 from config import (
-    ALPACA_API_KEY,
-    ALPACA_SECRET_KEY,
-    ALPACA_DATA_URL,
     MOM_RSI_MIN,
     MOM_RSI_MAX_SHORT,
     MOM_ADX_MIN,
@@ -26,14 +24,23 @@ from config import (
     SHORT_ENABLED,
     SHORT_EXCHANGES,
 )
-
-HEADERS = {
-    "APCA-API-KEY-ID":     ALPACA_API_KEY,
-    "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY,
-}
+from strategy_meanrev import (
+    fetch_bars as _fetch_cached_bars,
+    fetch_15min_bars_shared,
+    calc_rsi,
+    calc_adx,
+    calc_atr,
+)
+from market_data import SESSION, throttle_data_request
 
 NEWS_API_URL = "https://data.alpaca.markets/v1beta1/news"
 
+# ─── News Cache — الخبر نفسه يُطلب من Momentum و News Trap في MeanRev
+# لنفس السهم في نفس المسح — الـ TTL أقصر من فترة المسح (5 دقائق) عمداً:
+# نتيجة "لا خبر" يجب ألا تعيش حتى المسح التالي وإلا فات News Trap الخبر العاجل
+_news_cache: dict = {}   # ticker → (has_news, fetched_at)
+_NEWS_CACHE_TTL = 60     # ثانية
+
 
 # ─────────────────────────────────────────
 # نموذج إشارة Momentum
@@ -66,115 +73,43 @@ class MomentumSignal:
 # ─────────────────────────────────────────
 
 def fetch_15min_bars(ticker: str, bars: int = 100) -> pd.DataFrame:
-    end   = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-    start = (datetime.utcnow() - timedelta(days=3)).strftime("%Y-%m-%dT%H:%M:%SZ")
-
-    try:
-        response = requests.get(
-            f"{ALPACA_DATA_URL}/v2/stocks/{ticker}/bars",
-            headers=HEADERS,
-            params={
-                "timeframe": "15Min",
-                "start":     start,
-                "end":       end,
-                "limit":     bars,
-                "feed":      "iex",
-            },
-            timeout=15,
-        )
-        data = response.json().get("bars", [])
-        if not data:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(data)
-        df = df.rename(columns={"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"})
-        df["time"] = pd.to_datetime(df["t"])
-        return df.sort_values("time").reset_index(drop=True)
-
-    except Exception as e:
-        print(f"❌ خطأ في جلب 15min {ticker}: {e}")
-        return pd.DataFrame()
+    """
+    آخر 100 شمعة 15 دقيقة خلال 3 أيام — من نفس طلب MeanRev في هذا المسح.
+    (الطلب المنفصل السابق بـ limit=100 كان يُرجع أقدم الشموع في النافذة لا أحدثها)
+    """
+    df = fetch_15min_bars_shared(ticker)
+    if df.empty:
+        return df
+    since = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=3)
+    return df[df["time"] >= since].tail(bars).reset_index(drop=True)
 
 
 def fetch_daily_bars(ticker: str, days: int = 5) -> pd.DataFrame:
-    """يجلب آخر 5 شموع يومية لحساب الـ Gap."""
-    end   = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-    start = (datetime.utcnow() - timedelta(days=days + 5)).strftime("%Y-%m-%dT%H:%M:%SZ")
-
-    try:
-        response = requests.get(
-            f"{ALPACA_DATA_URL}/v2/stocks/{ticker}/bars",
-            headers=HEADERS,
-            params={
-                "timeframe": "1Day",
-                "start":     start,
-                "end":       end,
-                "limit":     days,
-                "feed":      "iex",
-            },
-            timeout=15,
-        )
-        data = response.json().get("bars", [])
-        if not data:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(data)
-        df = df.rename(columns={"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"})
-        df["time"] = pd.to_datetime(df["t"])
-        return df.sort_values("time").reset_index(drop=True)
-
-    except Exception as e:
-        return pd.DataFrame()
+    """
+    آخر 5 شموع يومية لحساب الـ Gap — من cache الشموع اليومية في MeanRev.
+    الـ cache يُحدَّث دفعة واحدة قبل كل مسح (prime_daily_cache) → لا طلب HTTP لكل سهم.
+    """
+    return _fetch_cached_bars(ticker, timeframe="1Day").tail(days).reset_index(drop=True)
 
 
 # ─────────────────────────────────────────
 # 2. حساب المؤشرات
 # ─────────────────────────────────────────
 
-def calc_rsi(closes: pd.Series, period: int = 14) -> float:
-    delta = closes.diff()
-    gain  = delta.clip(lower=0).rolling(period).mean()
-    loss  = (-delta.clip(upper=0)).rolling(period).mean()
-    rs    = gain / loss.replace(0, np.nan)
-    rsi   = 100 - (100 / (1 + rs))
-    val   = rsi.iloc[-1]
-    return round(float(val) if not pd.isna(val) else 50.0, 2)
-
-
-def calc_adx(df: pd.DataFrame, period: int = 14) -> float:
-    if len(df) < period * 2 + 1:
-        return 0.0
-    high, low, close = df["high"], df["low"], df["close"]
-    prev_close = close.shift(1)
-    tr = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
-    up_move   = high.diff()
-    down_move = -low.diff()
-    plus_dm  = pd.Series(np.where((up_move > down_move) & (up_move > 0), up_move, 0.0), index=df.index)
-    minus_dm = pd.Series(np.where((down_move > up_move) & (down_move > 0), down_move, 0.0), index=df.index)
-    atr_s    = tr.ewm(alpha=1/period, adjust=False).mean()
-    plus_di  = 100 * (plus_dm.ewm(alpha=1/period, adjust=False).mean()  / atr_s.replace(0, np.nan))
-    minus_di = 100 * (minus_dm.ewm(alpha=1/period, adjust=False).mean() / atr_s.replace(0, np.nan))
-    dx       = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di).replace(0, np.nan)
-    adx      = dx.ewm(alpha=1/period, adjust=False).mean()
-    val      = adx.iloc[-1]
-    return round(float(val) if not pd.isna(val) else 0.0, 2)
-
-
-def calc_atr(df: pd.DataFrame, period: int = 14) -> float:
-    prev_close = df["close"].shift(1)
-    tr = pd.concat([df["high"] - df["low"],
-                    (df["high"] - prev_close).abs(),
-                    (df["low"]  - prev_close).abs()], axis=1).max(axis=1)
-    atr = tr.rolling(period).mean().iloc[-1]
-    return round(float(atr) if not pd.isna(atr) else 0.0, 4)
+# RSI / ADX / ATR مشتركة مع MeanRev — نفس الحساب من مكان واحد (انظر الاستيراد أعلاه)
+MOM_RSI_PERIOD = 14
 
 
 def calc_vwap(df: pd.DataFrame) -> float:
     """VWAP تراكمي من بداية الجلسة."""
-    typical = (df["high"] + df["low"] + df["close"]) / 3
-    vwap    = (typical * df["volume"]).cumsum() / df["volume"].cumsum()
-    val     = vwap.iloc[-1]
-    return round(float(val) if not pd.isna(val) else 0.0, 4)
+    # نحتاج القيمة الأخيرة فقط = مجموع (السعر × الحجم) ÷ مجموع الحجم — بدون cumsum كامل
+    high, low, close = (df[c].to_numpy(dtype=np.float64) for c in ("high", "low", "close"))
+    volume    = df["volume"].to_numpy(dtype=np.float64)
+    total_vol = volume.sum()
+    if total_vol <= 0:
+        return 0.0
+    val = np.dot((high + low + close) / 3, volume) / total_vol
+    return round(float(val) if not np.isnan(val) else 0.0, 4)
 
 
 def calc_ema(closes: pd.Series, period: int) -> float:
@@ -195,10 +130,12 @@ def calc_volume_ratio(df: pd.DataFrame, lookback: int = 20) -> float:
     """نسبة حجم الشمعة الأخيرة مقارنة بالمتوسط."""
     if len(df) < lookback + 1:
         return 1.0
-    avg_vol = df["volume"].iloc[-lookback-1:-1].mean()
+    # ndarray مباشرة — بدون Series وسيطة من iloc لكل سهم
+    volume  = df["volume"].to_numpy(dtype=np.float64)
+    avg_vol = volume[-lookback-1:-1].mean()
     if avg_vol <= 0:
         return 1.0
-    return round(float(df["volume"].iloc[-1] / avg_vol), 2)
+    return round(float(volume[-1] / avg_vol), 2)
 
 
 def calc_gap_pct(df_daily: pd.DataFrame, df_15min: pd.DataFrame) -> float:
@@ -215,6 +152,31 @@ def calc_gap_pct(df_daily: pd.DataFrame, df_15min: pd.DataFrame) -> float:
     return round((today_open - prev_close) / prev_close, 4)
 
 
+@dataclass
+class MomentumIndicators:
+    """مؤشرات شموع 15 دقيقة — تُحسب مرة واحدة ويتشاركها LONG و SHORT."""
+    rsi:       float
+    adx:       float
+    atr:       float
+    vwap:      float
+    ema9:      float
+    ema20:     float
+    macd:      float
+    signal:    float
+    vol_ratio: float
+    gap_pct:   float
+
+
+def calc_indicators(df: pd.DataFrame, df_daily: pd.DataFrame) -> MomentumIndicators:
+    macd, signal = calc_macd(df["close"])
+    return MomentumIndicators(
+        rsi=calc_rsi(df["close"], MOM_RSI_PERIOD), adx=calc_adx(df), atr=calc_atr(df), vwap=calc_vwap(df),
+        ema9=calc_ema(df["close"], 9), ema20=calc_ema(df["close"], 20),
+        macd=macd, signal=signal,
+        vol_ratio=calc_volume_ratio(df), gap_pct=calc_gap_pct(df_daily, df),
+    )
+
+
 # ─────────────────────────────────────────
 # 3. فحص الأخبار
 # ─────────────────────────────────────────
@@ -222,13 +184,18 @@ def calc_gap_pct(df_daily: pd.DataFrame, df_15min: pd.DataFrame) -> float:
 def check_news(ticker: str) -> bool:
     """
     يتحقق إذا كان هناك خبر محرك في آخر 24 ساعة.
-    يستخدم Alpaca News API.
+    يستخدم Alpaca News API — مع cache قصير يزيل الطلب المكرر داخل المسح الواحد فقط.
     """
+    now    = time.monotonic()
+    cached = _news_cache.get(ticker)
+    if cached is not None and now - cached[1] < _NEWS_CACHE_TTL:
+        return cached[0]
+
     try:
         since = (datetime.utcnow() - timedelta(hours=24)).strftime("%Y-%m-%dT%H:%M:%SZ")
-        response = requests.get(
+        throttle_data_request()
+        response = SESSION.get(
             NEWS_API_URL,
-            headers=HEADERS,
             params={
                 "symbols": ticker,
                 "start":   since,
@@ -239,10 +206,16 @@ def check_news(ticker: str) -> bool:
         if response.status_code != 200:
             return False
 
-        news = response.json().get("news", [])
-        return len(news) > 0
+        news     = response.json().get("news", [])
+        has_news = len(news) > 0
+
+        # تنظيف المنتهية — لا يكبر الـ cache بلا حد مع تغيّر الـ universe
+        for key in [k for k, (_, at) in list(_news_cache.items()) if now - at >= _NEWS_CACHE_TTL]:
+            _news_cache.pop(key, None)
+        _news_cache[ticker] = (has_news, now)
+        return has_news
 
-    except Exception:
+    except (requests.RequestException, ValueError):
         return False
 
 
@@ -256,20 +229,18 @@ def _analyze_momentum_long(
     df_daily: pd.DataFrame,
     ema200: float,
     has_news: bool,
+    ind: MomentumIndicators | None = None,
 ) -> MomentumSignal:
 
     price = df["close"].iloc[-1]
 
-    rsi          = calc_rsi(df["close"])
-    adx          = calc_adx(df)
-    atr          = calc_atr(df)
+    ind          = ind or calc_indicators(df, df_daily)
+    rsi, adx, atr, vwap = ind.rsi, ind.adx, ind.atr, ind.vwap
     atr_pct      = atr / price if price > 0 else 0
-    vwap         = calc_vwap(df)
-    ema9         = calc_ema(df["close"], 9)
-    ema20        = calc_ema(df["close"], 20)
-    macd, signal = calc_macd(df["close"])
-    vol_ratio    = calc_volume_ratio(df)
-    gap_pct      = calc_gap_pct(df_daily, df)
+    ema9, ema20  = ind.ema9, ind.ema20
+    macd, signal = ind.macd, ind.signal
+    vol_ratio    = ind.vol_ratio
+    gap_pct      = ind.gap_pct
 
     def no_signal(reason: str) -> MomentumSignal:
         return MomentumSignal(
@@ -340,20 +311,26 @@ def _analyze_momentum_short(
     exchange: str,
     ema200: float,
     has_news: bool,
+    ind: MomentumIndicators | None = None,
 ) -> MomentumSignal:
 
+    # ── الفحوص الرخيصة أولاً — لا داعي لحساب 9 مؤشرات إذا SHORT مرفوض مسبقاً
+    if not SHORT_ENABLED or exchange not in SHORT_EXCHANGES:
+        return MomentumSignal(
+            ticker=ticker, side="short", has_signal=False,
+            reason="SHORT غير مفعّل" if not SHORT_ENABLED else "بورصة غير مدعومة للـ SHORT",
+            has_news=has_news,
+        )
+
     price = df["close"].iloc[-1]
 
-    rsi          = calc_rsi(df["close"])
-    adx          = calc_adx(df)
-    atr          = calc_atr(df)
+    ind          = ind or calc_indicators(df, df_daily)
+    rsi, adx, atr, vwap = ind.rsi, ind.adx, ind.atr, ind.vwap
     atr_pct      = atr / price if price > 0 else 0
-    vwap         = calc_vwap(df)
-    ema9         = calc_ema(df["close"], 9)
-    ema20        = calc_ema(df["close"], 20)
-    macd, signal = calc_macd(df["close"])
-    vol_ratio    = calc_volume_ratio(df)
-    gap_pct      = calc_gap_pct(df_daily, df)
+    ema9, ema20  = ind.ema9, ind.ema20
+    macd, signal = ind.macd, ind.signal
+    vol_ratio    = ind.vol_ratio
+    gap_pct      = ind.gap_pct
 
     def no_signal(reason: str) -> MomentumSignal:
         return MomentumSignal(
@@ -362,11 +339,6 @@ def _analyze_momentum_short(
             volume_ratio=vol_ratio, gap_pct=gap_pct, has_news=has_news,
         )
 
-    if not SHORT_ENABLED:
-        return no_signal("SHORT غير مفعّل")
-    if exchange not in SHORT_EXCHANGES:
-        return no_signal("بورصة غير مدعومة للـ SHORT")
-
     # ── فلتر 1: ADX > 25
     if adx < MOM_ADX_MIN:
         return no_signal(f"ADX={adx:.1f} (زخم ضعيف)")
@@ -423,13 +395,16 @@ def analyze(
     ticker:    str,
     exchange:  str  = "NASDAQ",
     ema200:    float = 0.0,
+    df_1day:   pd.DataFrame | None = None,
 ) -> MomentumSignal:
     """
     يحلل السهم بإستراتيجية Momentum على 15 دقيقة.
     يجرب LONG أولاً ثم SHORT.
+    df_1day: الشموع اليومية إن جلبها المستدعي مسبقاً (selector) — يُؤخذ منها آخر 5 شموع.
     """
     df       = fetch_15min_bars(ticker)
-    df_daily = fetch_daily_bars(ticker)
+    df_daily = (fetch_daily_bars(ticker) if df_1day is None
+                else df_1day.tail(5).reset_index(drop=True))
 
     min_bars = 30
     if df.empty or len(df) < min_bars:
@@ -441,8 +416,11 @@ def analyze(
     # فحص الأخبار مرة واحدة لكلا الاتجاهين
     has_news = check_news(ticker)
 
-    long_signal = _analyze_momentum_long(ticker, df, df_daily, ema200, has_news)
+    # المؤشرات نفسها للاتجاهين — تُحسب مرة واحدة
+    ind = calc_indicators(df, df_daily)
+
+    long_signal = _analyze_momentum_long(ticker, df, df_daily, ema200, has_news, ind=ind)
     if long_signal.has_signal:
         return long_signal
 
-    return _analyze_momentum_short(ticker, df, df_daily, exchange, ema200, has_news)
+    return _analyze_momentum_short(ticker, df, df_daily, exchange, ema200, has_news, ind=ind)
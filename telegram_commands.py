@@ -8,15 +8,27 @@
 # =============================================================
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import threading
 import os
 import time
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 
 from config import TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, TIMEZONE
 
-TZ = pytz.timezone(TIMEZONE)
+TZ = ZoneInfo(TIMEZONE)
+
+# ─── Session واحدة لـ Telegram — polling كل بضع ثوانٍ يعيد استخدام اتصال TLS نفسه
+# Retry مع backoff لأخطاء الاتصال فقط (الـ POST لا يُعاد بعد وصوله للسيرفر)
+TELEGRAM_API = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}"
+_tg_session  = requests.Session()
+_tg_session.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.3),
+))
 
 # ملف الـ flag على Render Disk
 # وجوده = النظام في صيانة، غيابه = النظام يعمل
@@ -69,10 +81,15 @@ class SystemState:
             except Exception:
                 pass
         self.maintenance_mode = False
+        # Event مضبوط = النظام يعمل — الحلقة الرئيسية تنام عليه أثناء الصيانة
+        # وتستيقظ فوراً عند /resume بدلاً من فحص الحالة كل 30 ثانية
+        self._running = threading.Event()
+        self._running.set()
 
     def enter_maintenance(self):
         """يُفعّل وضع الصيانة ويكتب الـ flag على الـ disk."""
         self.maintenance_mode = True
+        self._running.clear()
         try:
             os.makedirs(DISK_PATH, exist_ok=True)
             with open(MAINTENANCE_FLAG, "w") as f:
@@ -83,6 +100,7 @@ class SystemState:
     def exit_maintenance(self):
         """يُلغي وضع الصيانة ويحذف الـ flag."""
         self.maintenance_mode = False
+        self._running.set()
         try:
             if os.path.exists(MAINTENANCE_FLAG):
                 os.remove(MAINTENANCE_FLAG)
@@ -92,6 +110,10 @@ class SystemState:
     def is_running(self) -> bool:
         return not self.maintenance_mode
 
+    def wait_for_resume(self, timeout: float) -> bool:
+        """ينام حتى /resume أو انتهاء المهلة — True إذا عاد النظام للعمل."""
+        return self._running.wait(timeout)
+
 
 system_state = SystemState()
 
@@ -104,13 +126,12 @@ def _send(message: str) -> bool:
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         return False
     try:
-        url     = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
         payload = {
             "chat_id":    TELEGRAM_CHAT_ID,
             "text":       message,
             "parse_mode": "HTML",
         }
-        requests.post(url, json=payload, timeout=10)
+        _tg_session.post(f"{TELEGRAM_API}/sendMessage", json=payload, timeout=10)
         return True
     except Exception as e:
         print(f"Telegram error: {e}", flush=True)
@@ -127,13 +148,12 @@ def _now() -> str:
 
 def _get_updates() -> list:
     try:
-        url    = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/getUpdates"
         params = {
             "offset":  system_state._last_update_id + 1,
             "timeout": 5,
             "limit":   10,
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = _tg_session.get(f"{TELEGRAM_API}/getUpdates", params=params, timeout=10)
         return response.json().get("result", [])
     except Exception:
         return []
@@ -259,18 +279,25 @@ def _handle_command(command: str, context: dict):
         else:
             system_state._pending_closeall = False
             try:
-                from executor import close_all_positions, get_current_price, _delete_open_trades_sheets
+                from executor import (
+                    close_all_positions, get_current_prices, get_current_price, _delete_open_trades_sheets,
+                )
                 from notifier import notify_trade_closed
 
                 context_data = context() if callable(context) else context
                 open_trades  = context_data.get("open_trades", [])
                 risk_manager = context_data.get("risk_manager")
 
+                # ── أسعار كل الصفقات بطلب واحد — يقلّل التأخير قبل الإغلاق الفعلي
+                prices = get_current_prices([t.ticker for t in open_trades])
+
                 # ── حساب P&L لكل صفقة قبل الإغلاق
                 for trade in list(open_trades):
                     try:
-                        current_price = get_current_price(trade.ticker)
+                        # السهم الغائب من الطلب المجمّع → طلب منفرد كما في run_market_close
+                        current_price = prices.get(trade.ticker) or get_current_price(trade.ticker)
                         if current_price <= 0:
+                            print(f"⚠️  تعذّر جلب سعر {trade.ticker} — P&L محسوب على سعر الدخول", flush=True)
                             current_price = trade.entry_price
 
                         qty = getattr(trade, "quantity_remaining", trade.quantity)
@@ -381,10 +408,9 @@ def _handle_command(command: str, context: dict):
                     writer.writerows(trades)
                     csv_bytes = buffer.getvalue().encode("utf-8-sig")
 
-                    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendDocument"
                     _send(f"📄 جاري إرسال أرشيف <b>{month_str}</b> ({len(trades)} صفقة)...")
-                    requests.post(
-                        url,
+                    _tg_session.post(
+                        f"{TELEGRAM_API}/sendDocument",
                         data={"chat_id": TELEGRAM_CHAT_ID, "caption": f"📦 Archive {month_str} — {len(trades)} trades"},
                         files={"document": (f"archive_{month_str}.csv", csv_bytes, "text/csv")},
                         timeout=30,
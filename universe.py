@@ -6,6 +6,8 @@
 import requests
 import pandas as pd
 import time
+import os
+import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 
@@ -31,6 +33,10 @@ REQUEST_TIMEOUT = 20
 MAX_RETRIES     = 3
 RETRY_DELAY     = 1.5
 
+# ─── Session واحدة للمسح كله — اتصال keep-alive بدلاً من TLS جديد لكل طلب
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+
 # ─────────────────────────────────────────
 # Feed State — يتذكر أي feed نجح لهذه الجلسة
 # ─────────────────────────────────────────
@@ -38,6 +44,17 @@ RETRY_DELAY     = 1.5
 # يُضبط تلقائياً عند أول طلب ناجح ويُستخدم في كل الطلبات التالية
 _working_feed: str | None = "iex"   # نبدأ بـ iex كافتراض
 
+# ─── Universe Cache — نتيجة المسح اليومي تُحفظ على الـ disk
+# إعادة تشغيل السيرفر (Deploy) أثناء الجلسة تعيد استخدامها بدلاً من مسح آلاف الأسهم
+DISK_PATH           = os.getenv("RENDER_DISK_PATH", "logs")
+UNIVERSE_CACHE_FILE = os.path.join(DISK_PATH, "universe_cache.json")
+_last_universe_at   = 0.0   # timestamp آخر قائمة (جلب جديد أو من الـ cache)
+
+# ─── EMA200 Cache — EMA على 200 شمعة يومية لا يتغير فعلياً خلال الجلسة
+# تحديث الـ Universe كل ساعة كان يعيد جلب ~300 شمعة لكل سهم في كل مرة
+_ema_cache: dict = {}        # symbol → (ema200, fetched_at)
+_EMA_CACHE_TTL   = 6 * 3600  # 6 ساعات — تكفي ليوم تداول واحد
+
 
 # ─────────────────────────────────────────
 # 1. Safe Request Wrapper
@@ -68,9 +85,8 @@ def _safe_get(url: str, params: dict) -> requests.Response | None:
 
     while attempt < MAX_RETRIES:
         try:
-            response = requests.get(
+            response = SESSION.get(
                 url,
-                headers=HEADERS,
                 params=working_params,
                 timeout=REQUEST_TIMEOUT,
             )
@@ -262,14 +278,8 @@ def get_volume_data(assets: list) -> pd.DataFrame:
     if not results:
         return pd.DataFrame()
 
-    df = pd.DataFrame(results)
-    # ترتيب بـ volatility_score أولاً — الأكثر حركة في المقدمة
-    # ثم avg_volume كمعيار ثانوي للسيولة
-    df = df.sort_values(
-        ["volatility_score", "avg_volume"],
-        ascending=[False, False]
-    ).reset_index(drop=True)
-    return df
+    # بدون ترتيب كامل هنا — get_daily_universe يأخذ الأعلى فقط عبر nlargest
+    return pd.DataFrame(results)
 
 
 # ─────────────────────────────────────────
@@ -284,42 +294,79 @@ def get_ema200_batch(symbols: list) -> dict:
     ema_map    = {}
     batch_size = 50
 
-    for i in range(0, len(symbols), batch_size):
-        batch = symbols[i:i + batch_size]
-
-        response = _safe_get(
-            f"{ALPACA_DATA_URL}/v2/stocks/bars",
-            {
+    # ── من الـ cache أولاً — نجلب فقط الرموز الجديدة أو المنتهية صلاحيتها
+    now     = time.time()
+    missing = []
+    for symbol in symbols:
+        cached = _ema_cache.get(symbol)
+        if cached is not None and now - cached[1] < _EMA_CACHE_TTL:
+            ema_map[symbol] = cached[0]
+        else:
+            missing.append(symbol)
+
+    if ema_map:
+        print(f"EMA200 cache: {len(ema_map)} hit | {len(missing)} to fetch")
+
+    # تنظيف المنتهية قبل إضافة الجديدة — الأسهم التي خرجت من الـ universe لا تبقى للأبد
+    if missing:
+        for key in [k for k, (_, at) in _ema_cache.items() if now - at >= _EMA_CACHE_TTL]:
+            del _ema_cache[key]
+
+    for i in range(0, len(missing), batch_size):
+        batch = missing[i:i + batch_size]
+
+        # ── limit في الـ multi-symbol endpoint إجمالي لكل الرموز وليس لكل رمز
+        # لذلك نطلب صفحات كبيرة ونتبع next_page_token حتى تكتمل كل الرموز
+        data       = {}
+        page_token = None
+        complete   = False   # فشل صفحة لاحقة يترك سهم الحدود بأقدم شموعه → EMA قديم
+        while True:
+            params = {
                 "symbols":     ",".join(batch),
                 "timeframe":   "1Day",
                 "start":       start,
                 "end":         end,
-                "limit":       EMA_TREND + 10,
+                "limit":       10000,
                 "feed":        "iex",
                 "adjustment":  "raw",
-            },
-        )
+            }
+            if page_token:
+                params["page_token"] = page_token
 
-        if not response:
-            continue
+            response = _safe_get(f"{ALPACA_DATA_URL}/v2/stocks/bars", params)
+            if not response:
+                break
 
-        try:
-            data = response.json().get("bars", {})
-        except Exception:
+            try:
+                payload = response.json()
+            except ValueError:
+                break
+
+            for symbol, bars in (payload.get("bars") or {}).items():
+                data.setdefault(symbol, []).extend(bars)
+
+            page_token = payload.get("next_page_token")
+            if not page_token:
+                complete = True
+                break
+
+        if not complete:
+            # لا EMA ولا cache لهذه الدفعة — تبقى أسهمها غير مخزنة وتُعاد المحاولة في التحديث التالي
+            print(f"⚠️  EMA200: جلب غير مكتمل لـ {len(batch)} سهم — تخطي الدفعة")
+            time.sleep(0.4)
             continue
 
         for symbol, bars in data.items():
             if len(bars) < EMA_TREND:
                 continue
 
-            closes = [b["c"] for b in bars]
-            k      = 2 / (EMA_TREND + 1)
-            ema    = closes[0]
-
-            for c in closes[1:]:
-                ema = c * k + ema * (1 - k)
+            # نفس المعادلة التكرارية (adjust=False) لكنها تُنفَّذ في Cython
+            # بدلاً من حلقة Python على ~300 شمعة لكل سهم
+            closes = pd.Series([b["c"] for b in bars], dtype="float64")
+            ema    = closes.ewm(span=EMA_TREND, adjust=False).mean().iloc[-1]
 
-            ema_map[symbol] = round(ema, 4)
+            ema_map[symbol]    = round(float(ema), 4)
+            _ema_cache[symbol] = (ema_map[symbol], now)
 
         time.sleep(0.4)
 
@@ -330,7 +377,53 @@ def get_ema200_batch(symbols: list) -> dict:
 # Mean Reversion Optimized Universe
 # ─────────────────────────────────────────
 
-def get_daily_universe() -> dict:
+def universe_age_min() -> float:
+    """عمر القائمة الحالية بالدقائق — inf إذا لم تُحمَّل بعد."""
+    if not _last_universe_at:
+        return float("inf")
+    return (time.time() - _last_universe_at) / 60
+
+
+def _save_universe_cache(result: dict):
+    try:
+        os.makedirs(DISK_PATH, exist_ok=True)
+        with open(UNIVERSE_CACHE_FILE, "w") as f:
+            json.dump({"saved_at": time.time(), "stocks": result}, f)
+    except Exception as e:
+        print(f"⚠️  Could not save universe cache: {e}")
+
+
+def _load_universe_cache(max_age_min: float) -> dict:
+    """يُرجع القائمة المحفوظة إذا كان عمرها أقل من max_age_min — وإلا {}."""
+    global _last_universe_at
+    try:
+        with open(UNIVERSE_CACHE_FILE) as f:
+            data = json.load(f)
+        saved_at = float(data.get("saved_at", 0))
+        age_min  = (time.time() - saved_at) / 60
+        stocks   = data.get("stocks") or {}
+        if stocks and age_min < max_age_min:
+            _last_universe_at = saved_at
+            print(f"♻️  Universe from cache: {len(stocks)} stocks ({age_min:.0f} min old)")
+            return stocks
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️  Could not read universe cache: {e}")
+    return {}
+
+
+def get_daily_universe(max_cache_age_min: float = 0) -> dict:
+    """
+    max_cache_age_min > 0: يعيد استخدام آخر قائمة محفوظة إذا كانت أحدث من ذلك
+    (مثلاً بعد إعادة تشغيل أثناء الجلسة). 0 = مسح جديد دائماً.
+    """
+    global _last_universe_at
+
+    if max_cache_age_min > 0:
+        cached = _load_universe_cache(max_cache_age_min)
+        if cached:
+            return cached
 
     print(f"🔍 Selecting Mean Reversion universe... [feed={get_active_feed()}]")
 
@@ -345,8 +438,9 @@ def get_daily_universe() -> dict:
 
     print(f"After volume filter: {len(df)}")
 
-    # نختار أعلى سيولة فقط
-    candidates = df.head(UNIVERSE_SIZE)
+    # نختار الأكثر حركة فقط: volatility_score أولاً ثم avg_volume كمعيار ثانوي
+    # nlargest = partial sort O(n log k) بدلاً من ترتيب آلاف الأسهم كاملة
+    candidates = df.nlargest(UNIVERSE_SIZE, ["volatility_score", "avg_volume"])
 
     symbols_list = candidates["symbol"].tolist()
 
@@ -355,7 +449,7 @@ def get_daily_universe() -> dict:
 
     result = {}
 
-    for _, row in candidates.iterrows():
+    for row in candidates.to_dict("records"):
         symbol = row["symbol"]
         price  = row["last_price"]
         ema200 = ema_map.get(symbol, 0.0)
@@ -373,12 +467,16 @@ def get_daily_universe() -> dict:
             "volatility_score": row.get("volatility_score", 0.0),
         }
 
-    # طباعة أعلى 10 أسهم حركةً
-    top10 = sorted(result.items(), key=lambda x: x[1].get("volatility_score", 0), reverse=True)[:10]
+    # طباعة أعلى 10 أسهم حركةً — result مبني بترتيب nlargest مسبقاً
+    top10 = list(result.items())[:10]
     print("🔥 Top 10 Movers:")
     for sym, info in top10:
         print(f"   {sym:6s} | Δ={info['change_pct']:.1%} | Range={info['intraday_range']:.1%} | VolSpike={info['vol_spike']:.1f}x")
 
     print(f"✅ Selected {len(result)} stocks (sorted by volatility)")
 
+    if result:
+        _last_universe_at = time.time()
+        _save_universe_cache(result)
+
     return result